@@ -188,12 +188,13 @@ class INTACT_PT_ScanPanel(bpy.types.Panel):
                 col = split.column()
                 col.prop(INTACT_Props, "Resolution", text="")
 
-                if INTACT_Props.UserTiffDir:
-                    Box = layout.box()
-                    row = Box.row()
-                    row.alignment = "CENTER"
-                    row.scale_y = 2
-                    row.operator("intact.volume_render", icon="IMPORT")
+                row = layout.row()
+                split = row.split()
+                col = split.column()
+                col.prop(INTACT_Props, "StreamTiffIngest")
+                col = split.column()
+                col.enabled = INTACT_Props.StreamTiffIngest
+                col.prop(INTACT_Props, "IngestChunkSlices")
 
             if INTACT_Props.DataType == "DICOM Series":
 
@@ -204,14 +205,6 @@ class INTACT_PT_ScanPanel(bpy.types.Panel):
                 col = split.column()
                 col.prop(INTACT_Props, "UserDcmDir", text="")
 
-                if INTACT_Props.UserDcmDir:
-
-                    Box = layout.box()
-                    row = Box.row()
-                    row.alignment = "CENTER"
-                    row.scale_y = 2
-                    row.operator("intact.volume_render", icon="IMPORT")
-
             if INTACT_Props.DataType == "NRRD File":
 
                 row = layout.row()
@@ -221,13 +214,84 @@ class INTACT_PT_ScanPanel(bpy.types.Panel):
                 col = split.column()
                 col.prop(INTACT_Props, "UserImageFile", text="")
 
-                if INTACT_Props.UserImageFile:
+            row = layout.row()
+            split = row.split()
+            col = split.column()
+            col.label(text="Slice textures :")
+            col = split.column()
+            col.prop(INTACT_Props, "SliceTextureStorage", text="")
+
+            row = layout.row()
+            split = row.split()
+            col = split.column()
+            col.label(text="Render mode :")
+            col = split.column()
+            col.prop(INTACT_Props, "VolumeRenderMode", text="")
+
+            row = layout.row()
+            row.prop(INTACT_Props, "TextureBudget")
 
-                    Box = layout.box()
-                    row = Box.row()
-                    row.alignment = "CENTER"
-                    row.scale_y = 2
-                    row.operator("intact.volume_render", icon="IMPORT")
+            row = layout.row()
+            row.prop(INTACT_Props, "LodLevels")
+
+            row = layout.row()
+            row.prop(INTACT_Props, "ViewAlignedStacks")
+
+            row = layout.row()
+            row.prop(INTACT_Props, "BrickedVolume")
+            if INTACT_Props.BrickedVolume:
+                row.prop(INTACT_Props, "BrickSize")
+
+            row = layout.row()
+            row.prop(INTACT_Props, "SkipEmptySpace")
+            if (INTACT_Props.SkipEmptySpace or INTACT_Props.BrickedVolume
+                    or INTACT_Props.VolumeRenderMode == "VDB"):
+                row.prop(INTACT_Props, "EmptySpaceFloor")
+
+            row = layout.row()
+            split = row.split()
+            col = split.column()
+            col.label(text="Intensity window :")
+            col = split.column()
+            col.prop(INTACT_Props, "WindowMode", text="")
+            if INTACT_Props.WindowMode == "PERCENTILE":
+                row = layout.row()
+                row.prop(INTACT_Props, "WindowLowPercentile")
+                row.prop(INTACT_Props, "WindowHighPercentile")
+
+            row = layout.row()
+            row.prop(INTACT_Props, "AutoCrop")
+            if INTACT_Props.AutoCrop:
+                row.prop(INTACT_Props, "AutoCropThreshold")
+                row.prop(INTACT_Props, "AutoCropMargin")
+
+            row = layout.row()
+            row.prop(INTACT_Props, "UseIngestCache")
+            if INTACT_Props.UseIngestCache:
+                Box = layout.box()
+                row = Box.row()
+                split = row.split()
+                col = split.column()
+                col.label(text="Cache Directory :")
+                col = split.column()
+                col.prop(INTACT_Props, "CacheDir", text="")
+                row = Box.row()
+                row.prop(INTACT_Props, "CacheSizeLimit")
+                row = Box.row()
+                row.prop(INTACT_Props, "CacheContentHash")
+
+            SourcePath = {
+                "TIFF Stack": INTACT_Props.UserTiffDir,
+                "DICOM Series": INTACT_Props.UserDcmDir,
+                "NRRD File": INTACT_Props.UserImageFile,
+            }.get(INTACT_Props.DataType)
+            if SourcePath:
+
+                Box = layout.box()
+                row = Box.row()
+                row.alignment = "CENTER"
+                row.scale_y = 2
+                row.operator("intact.volume_render", icon="IMPORT")
 
         if context.object:
             if context.object.name.startswith("IT") and context.object.name.endswith(
@@ -485,6 +549,9 @@ class OBJECT_PT_Visualisation_Panel(bpy.types.Panel):
             row.scale_y = 2
             row.operator("intact.addslices", icon="EMPTY_AXIS")
 
+            row = layout.row()
+            row.operator("intact.export_slices", icon="EXPORT")
+
             row = layout.row()
             row.label(text="Slices contrast adjustment")
             row = layout.row()
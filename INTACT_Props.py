@@ -36,10 +36,14 @@ def TresholdUpdateFunction(self, context):
     GpNode = bpy.data.node_groups.get(GpShader)
     Low_Treshold = GpNode.nodes["Low_Treshold"].outputs[0]
     Low_Treshold.default_value = Threshold
+    # OpenVDB volumes have their own threshold node :
+    for mat in bpy.data.materials:
+        if mat.name.endswith("_Voxelmat_vdb") and mat.node_tree:
+            mat.node_tree.nodes["Low_Treshold"].outputs[0].default_value = Threshold
 
 
 def SliceIntensityUpdate(self, scene):
-    INTACT_Utils.SlicesUpdateAll(scene)
+    INTACT_Utils.SlicesUpdateAll(scene, Async=True)
 
 
 def text_body_update(self, context):
@@ -164,6 +168,48 @@ class ImageInfo(bpy.types.PropertyGroup):
         default=0.0
     )
 
+    RenderMode: bpy.props.StringProperty(
+        name="Render mode",
+        description="Volume render mode of the image, SLICES, ATLAS or VDB",
+        default="SLICES"
+    )
+
+    LodLevels: bpy.props.IntProperty(
+        name="LOD levels",
+        description="Number of coarser plane stacks of the volume render",
+        default=0
+    )
+
+    ViewStacks: bpy.props.BoolProperty(
+        name="View aligned stacks",
+        description="X and Y plane stacks were built next to the Z stack",
+        default=False
+    )
+
+    Bricks: bpy.props.StringProperty(
+        name="Bricks",
+        description="Voxel boxes of the occupied bricks of a bricked volume render (json), empty when not bricked",
+        default=""
+    )
+
+    Footprints: bpy.props.StringProperty(
+        name="Slice footprints",
+        description="Rectangle of the non empty voxels of every render slice, per stack axis (json), empty when not trimmed",
+        default=""
+    )
+
+    Stats: bpy.props.StringProperty(
+        name="Statistics",
+        description="Min, max and histogram of the source image (json)",
+        default=""
+    )
+
+    Stats255: bpy.props.StringProperty(
+        name="Statistics 0-255",
+        description="Min, max and histogram of the 0-255 image (json)",
+        default=""
+    )
+
     Size: bpy.props.IntVectorProperty(
         name="Size",
         description="Size",
@@ -263,6 +309,12 @@ class ImageInfo(bpy.types.PropertyGroup):
         default=""
     )
 
+    VdbPath: bpy.props.StringProperty(
+        name="VDB Path",
+        description="OpenVDB density grid of a VDB volume render",
+        default=""
+    )
+
     CT_Loaded: bpy.props.BoolProperty(
         name="CT data loaded",
         description="CT data loaded",
@@ -401,6 +453,176 @@ class INTACT_Props(bpy.types.PropertyGroup):
         description="Voxel resolution in mm",
         precision=4)
 
+    StreamTiffIngest: BoolProperty(
+        name="Streaming ingest",
+        description="Read the TIFF stack in chunks of slices instead of loading the whole volume at once",
+        default=True,
+    )
+
+    IngestChunkSlices: IntProperty(
+        name="Chunk size",
+        description="Number of slices read at once during a streaming ingest",
+        default=64,
+        min=1,
+        soft_max=512,
+    )
+
+    WindowMode: EnumProperty(
+        items=(
+            ("MINMAX", "Min - Max", "Window the full intensity range of the scan to 0-255"),
+            ("PERCENTILE", "Percentiles", "Window the range between two histogram percentiles to 0-255, robust to a few very bright or dark voxels"),
+        ),
+        name="Intensity window",
+        description="Intensity range mapped to the 0-255 volume",
+        default="MINMAX",
+    )
+
+    WindowLowPercentile: FloatProperty(
+        name="Low (%)",
+        description="Histogram percentile mapped to 0",
+        default=0.5,
+        min=0.0,
+        max=100.0,
+        precision=2,
+    )
+
+    WindowHighPercentile: FloatProperty(
+        name="High (%)",
+        description="Histogram percentile mapped to 255",
+        default=99.9,
+        min=0.0,
+        max=100.0,
+        precision=2,
+    )
+
+    AutoCrop: BoolProperty(
+        name="Auto crop",
+        description="Crop the empty air around the object before the volume is written",
+        default=False,
+    )
+
+    AutoCropThreshold: IntProperty(
+        name="Noise level",
+        description="Voxels at or below this 0-255 intensity count as empty air",
+        default=20,
+        min=0,
+        max=254,
+    )
+
+    AutoCropMargin: IntProperty(
+        name="Margin",
+        description="Voxels kept around the object on every side",
+        default=5,
+        min=0,
+        soft_max=100,
+    )
+
+    SliceTextureStorage: EnumProperty(
+        items=(
+            ("PACKED", "Packed", "Pack the slice textures into the .blend file, "
+             "every save rewrites them"),
+            ("EXTERNAL", "External", "Keep the slice textures as compressed PNG files in the project "
+             "Textures directory, referenced by relative path. They are only read when first drawn, "
+             "the .blend stays small and saves and reopens fast"),
+        ),
+        name="Texture storage",
+        description="Where the CT slice textures are stored",
+        default="EXTERNAL",
+    )
+
+    VolumeRenderMode: EnumProperty(
+        items=(
+            ("ATLAS", "Texture atlas", "One material for the volume, the slices are packed into a few large textures"),
+            ("SLICES", "Slice materials", "One material and one texture per slice"),
+            ("VDB", "OpenVDB volume", "A Blender Volume object reading a sparse density grid, "
+             "the voxels at or below the empty space floor are left out. Needs the OpenVDB python module"),
+        ),
+        name="Render mode",
+        description="How the CT slices are textured in the volume render",
+        default="SLICES",
+    )
+
+    LodLevels: IntProperty(
+        name="Navigation LODs",
+        description="Coarser plane stacks (every 2nd, 4th... slice) shown while the viewport is navigated",
+        default=0,
+        min=0,
+        max=3,
+    )
+
+    ViewAlignedStacks: BoolProperty(
+        name="View aligned stacks",
+        description="Also build X and Y plane stacks and show the one most aligned with the view. "
+        "The texture budget is shared by the three stacks",
+        default=False,
+    )
+
+    BrickedVolume: BoolProperty(
+        name="Bricked volume",
+        description="Split the volume into bricks, each a small plane stack. Empty bricks are skipped, "
+        "bricks outside the view or inside the cropping cube are hidden",
+        default=False,
+    )
+
+    BrickSize: IntProperty(
+        name="Brick size",
+        description="Side of the bricks, in render voxels",
+        default=128,
+        min=32,
+        max=512,
+    )
+
+    SkipEmptySpace: BoolProperty(
+        name="Skip empty space",
+        description="Trim every volume plane to its non empty voxels and drop empty planes",
+        default=False,
+    )
+
+    EmptySpaceFloor: IntProperty(
+        name="Floor",
+        description="Voxels at or below this 0-255 intensity count as empty, for plane trimming, bricks and VDB",
+        default=20,
+        min=0,
+        max=254,
+    )
+
+    TextureBudget: FloatProperty(
+        name="Texture budget (MB)",
+        description="Memory allowed for the CT slice textures, larger scans are downsampled to fit",
+        default=1024.0,
+        min=16.0,
+        soft_max=8192.0,
+    )
+
+    UseIngestCache: BoolProperty(
+        name="Ingest cache",
+        description="Reuse the windowed volume and textures of scans that were loaded before",
+        default=True,
+    )
+
+    CacheDir: StringProperty(
+        name="Cache Directory",
+        default="",
+        update=lambda s, c: make_path_absolute('CacheDir'),
+        description="Ingest cache directory, the INTACT_cache folder of the user scripts is used when empty",
+        subtype="DIR_PATH",
+    )
+
+    CacheSizeLimit: FloatProperty(
+        name="Cache size (GB)",
+        description="Maximum size of the ingest cache, least recently used scans are removed first",
+        default=10.0,
+        min=0.0,
+        precision=1,
+    )
+
+    CacheContentHash: BoolProperty(
+        name="Hash file content",
+        description="Also hash the content of the source files, slower but safe against files "
+                    "rewritten with the same size and date",
+        default=False,
+    )
+
     #######################
 
     GroupNodeName: StringProperty(
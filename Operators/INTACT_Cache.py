@@ -0,0 +1,184 @@
+# Python imports :
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from os.path import join, exists, isdir
+
+import bpy
+
+#######################################################################################
+# Persistent ingest cache :
+# Every loaded scan is stored under a key computed from its source files and the
+# ingest settings. An entry holds the windowed uint8 volume (nrrd), the render
+# resolution volume the slice textures are made from (npy) and the image metadata.
+# The texture files (slice PNGs or atlas pages) made from the render volume are kept
+# in the entry as well, one folder per set of texture settings.
+#######################################################################################
+
+META_FILE = "meta.json"
+NRRD_FILE = "Image3D255.nrrd"
+RENDER_FILE = "Render255.npy"
+TEXTURES_DIR = "textures"
+TEXTURES_META_FILE = "textures.json"
+# Bumped when the content of the entries changes, older entries are never hit :
+CACHE_VERSION = 3
+
+
+def default_cache_dir():
+    """Per user cache folder, kept across addon updates and reinstalls. Main thread only"""
+    return bpy.utils.user_resource("SCRIPTS", path="INTACT_cache", create=True)
+
+
+def cache_root(CacheDir):
+    Root = CacheDir
+    if not exists(Root):
+        os.makedirs(Root)
+    return Root
+
+
+def source_files(SourcePath):
+    """Files making up a source image : the sorted content of a folder, or the file itself"""
+    if isdir(SourcePath):
+        Names = sorted(os.listdir(SourcePath))
+        return [join(SourcePath, n) for n in Names if not isdir(join(SourcePath, n))]
+    return [SourcePath]
+
+
+def file_digest(FilePath, BlockSize=1 << 20):
+    Digest = hashlib.blake2b(digest_size=16)
+    with open(FilePath, "rb") as rf:
+        for Block in iter(lambda: rf.read(BlockSize), b""):
+            Digest.update(Block)
+    return Digest.hexdigest()
+
+
+def fingerprint(SourcePath, Settings, ContentHash=False):
+    """Cache key of a source image : paths, sizes and mtimes of its files (and
+    optionally a hash of their content) together with the ingest Settings"""
+    Files = []
+    for FilePath in source_files(SourcePath):
+        Stat = os.stat(FilePath)
+        Entry = [FilePath, Stat.st_size, Stat.st_mtime_ns]
+        if ContentHash:
+            Entry.append(file_digest(FilePath))
+        Files.append(Entry)
+
+    Description = json.dumps({"files": Files, "settings": Settings,
+                              "version": CACHE_VERSION}, sort_keys=True)
+    return hashlib.sha1(Description.encode("utf-8")).hexdigest()
+
+
+def lookup(CacheDir, Key):
+    """Return the entry directory of Key, or None. A hit marks the entry as most recently used"""
+    EntryDir = join(cache_root(CacheDir), Key)
+    MetaPath = join(EntryDir, META_FILE)
+    if not exists(MetaPath):
+        return None
+    os.utime(MetaPath)
+    return EntryDir
+
+
+def read_meta(EntryDir):
+    with open(join(EntryDir, META_FILE), "r") as rf:
+        return json.load(rf)
+
+
+def load_render_volume(EntryDir):
+    """Memory mapped (z, y, x) uint8 render volume of an entry"""
+    return np.load(join(EntryDir, RENDER_FILE), mmap_mode="r")
+
+
+def store(CacheDir, Key, Nrrd255Path, RenderArray, Meta, SizeLimit):
+    """Add an entry for Key, then evict least recently used entries above SizeLimit (bytes)"""
+    Root = cache_root(CacheDir)
+    EntryDir = join(Root, Key)
+    TmpDir = f"{EntryDir}.tmp"
+    if exists(TmpDir):
+        shutil.rmtree(TmpDir)
+    os.makedirs(TmpDir)
+
+    shutil.copyfile(Nrrd255Path, join(TmpDir, NRRD_FILE))
+    np.save(join(TmpDir, RENDER_FILE), np.ascontiguousarray(RenderArray))
+    # meta.json is written last, an entry without it is never used :
+    with open(join(TmpDir, META_FILE), "w") as wf:
+        json.dump(Meta, wf)
+
+    if exists(EntryDir):
+        shutil.rmtree(EntryDir)
+    os.replace(TmpDir, EntryDir)
+
+    evict(Root, SizeLimit, Keep=Key)
+    return EntryDir
+
+
+def texture_key(TextureSettings):
+    """Key of the textures made from an entry render volume with TextureSettings"""
+    Description = json.dumps(TextureSettings, sort_keys=True)
+    return hashlib.sha1(Description.encode("utf-8")).hexdigest()
+
+
+def lookup_textures(EntryDir, TextureKey):
+    """Return the texture folder of TextureKey in an entry and its meta, or (None, None)"""
+    TexDir = join(EntryDir, TEXTURES_DIR, TextureKey)
+    MetaPath = join(TexDir, TEXTURES_META_FILE)
+    if not exists(MetaPath):
+        return None, None
+    with open(MetaPath, "r") as rf:
+        return TexDir, json.load(rf)
+
+
+def begin_textures(EntryDir, TextureKey):
+    """Temporary texture folder of TextureKey, filled by add_texture"""
+    TmpDir = join(EntryDir, TEXTURES_DIR, f"{TextureKey}.tmp")
+    if exists(TmpDir):
+        shutil.rmtree(TmpDir)
+    os.makedirs(TmpDir)
+    return TmpDir
+
+
+def add_texture(TmpDir, Name, FilePath):
+    # Copied rather than linked : the project copy may be rewritten in place
+    shutil.copyfile(FilePath, join(TmpDir, Name))
+
+
+def commit_textures(TmpDir, TexturesMeta):
+    """Write the textures meta of a folder made by begin_textures and make it visible"""
+    # textures.json is written last, a folder without it is never used :
+    with open(join(TmpDir, TEXTURES_META_FILE), "w") as wf:
+        json.dump(TexturesMeta, wf)
+    TexDir = TmpDir[:-len(".tmp")]
+    if exists(TexDir):
+        shutil.rmtree(TexDir)
+    os.replace(TmpDir, TexDir)
+    return TexDir
+
+
+def entry_size(EntryDir):
+    return sum(os.path.getsize(join(Dir, f))
+               for Dir, _, Files in os.walk(EntryDir) for f in Files)
+
+
+def evict(Root, SizeLimit, Keep=None):
+    """Remove least recently used entries until the cache fits in SizeLimit (bytes)"""
+    Entries = []
+    for Name in os.listdir(Root):
+        EntryDir = join(Root, Name)
+        MetaPath = join(EntryDir, META_FILE)
+        if not isdir(EntryDir):
+            continue
+        if not exists(MetaPath):
+            # Incomplete entry left by an interrupted load :
+            shutil.rmtree(EntryDir, ignore_errors=True)
+            continue
+        Entries.append((os.path.getmtime(MetaPath), Name, entry_size(EntryDir)))
+
+    Total = sum(e[2] for e in Entries)
+    for _, Name, Size in sorted(Entries):
+        if Total <= SizeLimit:
+            break
+        if Name == Keep:
+            continue
+        shutil.rmtree(join(Root, Name), ignore_errors=True)
+        Total -= Size
@@ -0,0 +1,163 @@
+# Python imports :
+import os
+import json
+import numpy as np
+from os.path import join, exists, isdir, abspath
+
+import SimpleITK as sitk
+
+from . import INTACT_Utils as utils
+
+#######################################################################################
+# DICOM directory index :
+# The headers of a DICOM folder are parsed once, in parallel, and stored in a compact
+# json index in the project directory. Later loads only parse the files whose mtime or
+# size changed, instead of letting GDCM scan the whole folder again for every series.
+#######################################################################################
+
+INDEX_FILE = "INTACT_DicomIndex.json"
+# Bumped when the file entries change, older index files are parsed again :
+INDEX_VERSION = 2
+
+Tags = {
+    "SeriesUID": "0020|000e",
+    "Position": "0020|0032",
+    "Orientation": "0020|0037",
+    "PixelSpacing": "0028|0030",
+    "SliceThickness": "0018|0050",
+    "Slope": "0028|1053",
+    "Intercept": "0028|1052",
+    "InstanceNumber": "0020|0013",
+}
+
+
+def parse_numbers(Value):
+    return [float(v) for v in Value.strip().split("\\") if v.strip()]
+
+
+def read_header(FilePath):
+    """Header entry of one DICOM file, or None if the file is not a DICOM image"""
+    reader = sitk.ImageFileReader()
+    reader.SetImageIO("GDCMImageIO")
+    reader.SetFileName(FilePath)
+    try:
+        reader.ReadImageInformation()
+    except RuntimeError:
+        return None
+
+    def Get(Tag, Default=""):
+        return reader.GetMetaData(Tag) if reader.HasMetaDataKey(Tag) else Default
+
+    SeriesUID = Get(Tags["SeriesUID"]).strip()
+    if not SeriesUID:
+        return None
+
+    return {
+        "SeriesUID": SeriesUID,
+        "Position": parse_numbers(Get(Tags["Position"])) or [0.0, 0.0, 0.0],
+        "Orientation": parse_numbers(Get(Tags["Orientation"])) or [1.0, 0.0, 0.0, 0.0, 1.0, 0.0],
+        "PixelSpacing": parse_numbers(Get(Tags["PixelSpacing"])) or [1.0, 1.0],
+        "SliceThickness": (parse_numbers(Get(Tags["SliceThickness"])) or [0.0])[0],
+        "Slope": (parse_numbers(Get(Tags["Slope"])) or [1.0])[0],
+        "Intercept": (parse_numbers(Get(Tags["Intercept"])) or [0.0])[0],
+        "InstanceNumber": int((parse_numbers(Get(Tags["InstanceNumber"])) or [0])[0]),
+    }
+
+
+def load_index(IndexPath):
+    if exists(IndexPath):
+        try:
+            with open(IndexPath, "r") as rf:
+                Index = json.load(rf)
+            if Index.get("version") == INDEX_VERSION:
+                return Index
+        except (OSError, ValueError):
+            pass
+    return {"version": INDEX_VERSION, "folders": {}}
+
+
+def update_index(DcmDir, IndexPath):
+    """Return the index of DcmDir, parsing only new or modified files.
+
+    The index file holds one entry per indexed folder, each file entry keeps
+    the mtime and size it was parsed with.
+    """
+    DcmDir = abspath(DcmDir)
+    Index = load_index(IndexPath)
+    OldFiles = Index["folders"].get(DcmDir, {})
+    Files = {}
+    ToParse = []
+
+    for Name in sorted(os.listdir(DcmDir)):
+        FilePath = join(DcmDir, Name)
+        if isdir(FilePath):
+            continue
+        Stat = os.stat(FilePath)
+        Old = OldFiles.get(Name)
+        if Old and Old["mtime"] == Stat.st_mtime_ns and Old["size"] == Stat.st_size:
+            Files[Name] = Old
+        else:
+            ToParse.append((Name, Stat.st_mtime_ns, Stat.st_size))
+
+    def Worker(Task):
+        return read_header(join(DcmDir, Task[0]))
+
+    def Consumer(Task, Header):
+        Name, mtime, size = Task
+        # Non DICOM files are indexed too, so they are not parsed again :
+        Files[Name] = dict(Header or {}, mtime=mtime, size=size)
+
+    if ToParse:
+        print(f"Indexing {len(ToParse)} DICOM files...")
+        utils.RunWorkerPool(Worker, ToParse, Consumer)
+
+    if ToParse or len(Files) != len(OldFiles):
+        Index["folders"][DcmDir] = Files
+        with open(IndexPath, "w") as wf:
+            json.dump(Index, wf, separators=(",", ":"))
+
+    return Files
+
+
+def slice_normal(Orientation):
+    Row, Col = np.array(Orientation[:3]), np.array(Orientation[3:6])
+    return np.cross(Row, Col)
+
+
+def geometry_key(Entry):
+    """Pixel spacing and orientation of a file, rounded so that float noise in the
+    headers does not split a series"""
+    return (tuple(round(v, 4) for v in Entry["PixelSpacing"]),
+            tuple(round(v, 4) for v in Entry["Orientation"]))
+
+
+def largest_series(Files, DcmDir):
+    """(SeriesUID, sorted file paths, entries) of the series with most files.
+
+    A series mixing pixel spacings or orientations (scouts, localizers) is
+    split by geometry and only its largest part is kept. Files are sorted
+    along the slice normal like the GDCM IPP sorter does, returns
+    (None, [], []) when the folder holds no DICOM series.
+    """
+    Series = {}
+    for Name, Entry in Files.items():
+        if "SeriesUID" in Entry:
+            Key = (Entry["SeriesUID"], geometry_key(Entry))
+            Series.setdefault(Key, []).append((Name, Entry))
+    if not Series:
+        return None, [], []
+
+    (SeriesUID, _), Members = max(Series.items(), key=lambda s: len(s[1]))
+    Normal = slice_normal(Members[0][1]["Orientation"])
+    Members.sort(key=lambda m: (float(np.dot(Normal, m[1]["Position"])),
+                                m[1]["InstanceNumber"], m[0]))
+
+    return (SeriesUID,
+            [join(DcmDir, Name) for Name, _ in Members],
+            [Entry for _, Entry in Members])
+
+
+def mixed_rescale(Entries):
+    """True when the files of a series do not share the same rescale slope and
+    intercept, their pixel values then need a float image"""
+    return len({(e.get("Slope", 1.0), e.get("Intercept", 0.0)) for e in Entries}) > 1
@@ -1,6 +1,7 @@
 import bpy
 import os
 from . import INTACT_Utils
+from . import INTACT_VolumeView
 import math
 
 
@@ -106,6 +107,9 @@ class RenderImage(bpy.types.Operator):
         # Set up lighting
         setup_world_hdri(context)
 
+        # Stacks and bricks seen from the camera :
+        INTACT_VolumeView.prepare_render(context.scene, context.evaluated_depsgraph_get())
+
         bpy.ops.render.render('INVOKE_DEFAULT')
         return {'FINISHED'}
 
@@ -220,6 +224,8 @@ class RenderTurntable(bpy.types.Operator):
         path.hide_set(True)
         empty.hide_set(True)
 
+        INTACT_VolumeView.prepare_render(context.scene, context.evaluated_depsgraph_get(),
+                                         Animation=True)
         bpy.ops.render.render('INVOKE_DEFAULT', animation=True)
 
         return {'FINISHED'}
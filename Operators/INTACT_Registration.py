@@ -421,11 +421,6 @@ class INTACT_OT_MultiTreshSegment(bpy.types.Operator):
                         print(f"step 1 : Read DICOM ({self.step1-self.counter_start})")
 
                         Image3D = sitk.ReadImage(self.Nrrd255Path)
-                        minmax = sitk.MinimumMaximumImageFilter()
-                        minmax.Execute(Image3D)
-                        Imax = minmax.GetMaximum()
-                        Imin = minmax.GetMinimum()
-                        print(Imin, Imax)
 
                         Sp = self.ImageInfo.Spacing
                         print('Resolution', Sp)
@@ -1,18 +1,26 @@
 import bpy
 import stat
 import os
-import threading
 import shutil
+import json
+import threading
+import traceback
 import numpy as np
 from time import perf_counter as Tcounter
 from os.path import split, join, exists, abspath, dirname
-from queue import Queue
+from queue import Queue, Empty, Full
 from mathutils import Matrix, Vector
+from bpy.app.handlers import persistent
 import SimpleITK as sitk
 import cv2
 
 from vtkmodules.vtkCommonCore import vtkCommand
 from . import INTACT_Utils as utils
+from . import INTACT_Cache as cache
+from . import INTACT_DicomIndex as dcm_index
+from . import INTACT_Vdb as vdb
+from .INTACT_Stats import (VolumeStats, volume_stats, MaxProjections, max_projections,
+                           slice_footprints, occupied_bricks)
 
 # Global Variables :
 ProgEvent = vtkCommand.ProgressEvent
@@ -29,40 +37,32 @@ def rmtree(top):
     os.rmdir(top)
 
 
-def GetMaxSerie(UserDcmDir):
+# External textures are single channel PNGs, zlib level 6 keeps them compact :
+PNG_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 6]
 
-    SeriesDict = {}
-    Series_reader = sitk.ImageSeriesReader()
-    series_IDs = Series_reader.GetGDCMSeriesIDs(UserDcmDir)
 
-    if not series_IDs:
+class IngestCancelled(Exception):
+    pass
 
-        message = ["No valid DICOM Serie found in DICOM Folder ! "]
-        print(message)
-        utils.ShowMessageBox(message=message, icon="COLORSET_01_VEC")
-        return {"CANCELLED"}
 
-    def GetSerieCount(sID):
-        count = len(Series_reader.GetGDCMSeriesFileNames(UserDcmDir, sID))
-        SeriesDict[count] = sID
+class IngestError(Exception):
+    """Ingest failure to report to the user, message is a list of lines"""
 
-    threads = [
-        threading.Thread(
-            target=GetSerieCount,
-            args=[sID],
-            daemon=True,
-        )
-        for sID in series_IDs
-    ]
+    def __init__(self, message):
+        super().__init__(" ".join(message))
+        self.message = message
+
+
+def GetMaxSerie(UserDcmDir, IndexPath):
+    """Series of UserDcmDir with the most files, from the project DICOM index"""
+    Files = dcm_index.update_index(UserDcmDir, IndexPath)
+    MaxSerie, DcmSerie, Entries = dcm_index.largest_series(Files, abspath(UserDcmDir))
 
-    for t in threads:
-        t.start()
+    if not MaxSerie:
+        # Raised on the ingest thread, the message box is shown by the operator :
+        raise IngestError(["No valid DICOM Serie found in DICOM Folder ! "])
 
-    for t in threads:
-        t.join()
-    MaxCount = sorted(SeriesDict, reverse=True)[0]
-    MaxSerie = SeriesDict[MaxCount]
-    return MaxSerie, MaxCount
+    return MaxSerie, DcmSerie, Entries
 
 
 def all_files_exist(user_project_dir, user_image_path, image_type):
@@ -109,8 +109,11 @@ def is_image_supported(UserImageFile):
         utils.ShowMessageBox(message=message, icon="COLORSET_01_VEC")
         return False
 
-    Image3D = sitk.ReadImage(UserImageFile)
-    Depth = Image3D.GetDepth()
+    # Only the header is read here, the image itself is read by the ingest job :
+    reader.SetFileName(UserImageFile)
+    reader.ReadImageInformation()
+    Size = reader.GetSize()
+    Depth = Size[2] if len(Size) > 2 else 0
 
     if Depth == 0:
         message = [
@@ -124,7 +127,7 @@ def is_image_supported(UserImageFile):
     INTACT_nrrd = is_intact_nrrd(UserImageFile)
 
     HU_Image = False
-    if Image3D.GetPixelIDTypeAsString() in [
+    if sitk.GetPixelIDValueAsString(reader.GetPixelID()) in [
         "32-bit signed integer",
         "16-bit signed integer",
     ]:
@@ -146,23 +149,21 @@ def save_blend_file(user_project_dir):
     ProjectName = Split[-1] or Split[-2]
     BlendFile = f"{ProjectName}_CT-SCAN.blend"
     Blendpath = join(user_project_dir, BlendFile)
+    # Already the project file : it is saved once the load is done
+    if bpy.data.filepath and abspath(bpy.data.filepath) == abspath(Blendpath):
+        utils.MarkProjectDirty()
+        return
+    # The file path must be set before the textures get their relative paths :
     bpy.ops.wm.save_as_mainfile(filepath=Blendpath)
 
 
-def read_dicom_image(user_dcm_dir):
+def read_dicom_image(user_dcm_dir, user_project_dir):
     # Start Reading Dicom data :
-    Series_reader = sitk.ImageSeriesReader()
-    MaxSerie, MaxCount = GetMaxSerie(user_dcm_dir)
-    DcmSerie = Series_reader.GetGDCMSeriesFileNames(user_dcm_dir, MaxSerie)
-
-    # Get StudyInfo :
-    reader = sitk.ImageFileReader()
-    reader.SetImageIO('GDCMImageIO')
-    reader.SetFileName(DcmSerie[0])
-    reader.LoadPrivateTagsOn()
-    reader.ReadImageInformation()
-
-    Image3D = sitk.ReadImage(DcmSerie, imageIO='GDCMImageIO')
+    IndexPath = join(user_project_dir, dcm_index.INDEX_FILE)
+    MaxSerie, DcmSerie, Entries = GetMaxSerie(user_dcm_dir, IndexPath)
+    # Rescaled values of the first file may not hold those of the other ones :
+    PixelType = sitk.sitkFloat32 if dcm_index.mixed_rescale(Entries) else sitk.sitkUnknown
+    Image3D = sitk.ReadImage(DcmSerie, PixelType, imageIO='GDCMImageIO')
 
     # Get Dicom Info :
     Spacing = Image3D.GetSpacing()
@@ -199,6 +200,115 @@ def read_tiff_image(user_tiff_dir, resolution):
     return Image3D, Spacing, Size, Origin
 
 
+def read_tiff_chunks(TiffSerie, ChunkSize):
+    """Yield (first slice index, (z, y, x) array) chunks of a TIFF stack"""
+    for start in range(0, len(TiffSerie), ChunkSize):
+        Chunk = sitk.ReadImage(TiffSerie[start:start + ChunkSize], imageIO='TIFFImageIO')
+        Array = sitk.GetArrayFromImage(Chunk)
+        if Array.ndim == 2:
+            Array = Array[np.newaxis]
+        yield start, Array
+
+
+def window_array(Array, Wmin, Wmax, out=None):
+    """Window Array to 0-255 uint8, same mapping as sitk.IntensityWindowing + Cast"""
+    Scale = 255.0 / (Wmax - Wmin) if Wmax > Wmin else 0.0
+    Windowed = (Array.astype(np.float32) - Wmin) * Scale
+    np.clip(Windowed, 0.0, 255.0, out=Windowed)
+    if out is None:
+        return Windowed.astype(np.uint8)
+    out[...] = Windowed
+    return out
+
+
+def stats_window(Stats, Percentiles=None):
+    """Intensity window of a volume : its min/max, or the (low, high) Percentiles"""
+    if Percentiles:
+        Wmin, Wmax = (Stats.percentile(p) for p in Percentiles)
+        if Wmax > Wmin:
+            return Wmin, Wmax
+    return Stats.Min, Stats.Max
+
+
+def write_nrrd_header(wf, Size, Spacing, Origin, Direction):
+    """Header of a raw uint8 nrrd, its voxels are written after it in (z, y, x) order"""
+    D = np.array(Direction, dtype=np.float64).reshape(3, 3)
+    Axes = " ".join("(" + ",".join(repr(float(D[r, c] * Spacing[c])) for r in range(3)) + ")"
+                    for c in range(3))
+    Lines = [
+        "NRRD0004",
+        "type: unsigned char",
+        "dimension: 3",
+        "space: left-posterior-superior",
+        f"sizes: {Size[0]} {Size[1]} {Size[2]}",
+        f"space directions: {Axes}",
+        "kinds: domain domain domain",
+        "encoding: raw",
+        "space origin: (" + ",".join(repr(float(v)) for v in Origin) + ")",
+    ]
+    wf.write(("\n".join(Lines) + "\n\n").encode("ascii"))
+
+
+def read_tiff_image_streaming(user_tiff_dir, resolution, ChunkSize, Nrrd255Path, Direction,
+                              Progress=None, Percentiles=None, Projections=None):
+    """Read a TIFF stack in chunks of slices, straight to a windowed uint8 nrrd.
+
+    The first pass only computes the volume statistics, the second pass
+    windows each chunk and appends it to the raw Nrrd255Path, so neither the
+    source volume nor a second copy of the uint8 volume is held in memory.
+    The uint8 image is then read back once. Progress(ratio) is called after
+    every chunk. The window is the min/max of the stack, or its (low, high)
+    Percentiles. Projections (MaxProjections) is filled with the windowed
+    chunks if given.
+    """
+    TiffSerie = [join(user_tiff_dir, s) for s in sorted(os.listdir(user_tiff_dir))]
+    Steps = 2 * len(range(0, len(TiffSerie), ChunkSize))
+    Step = 0
+
+    # Get StudyInfo :
+    reader = sitk.ImageFileReader()
+    reader.SetImageIO('TIFFImageIO')
+    reader.SetFileName(TiffSerie[0])
+    reader.ReadImageInformation()
+    PixelType = sitk.GetPixelIDValueAsString(reader.GetPixelID())
+
+    # First pass : statistics and min/max window
+    Stats = VolumeStats()
+    for _, Array in read_tiff_chunks(TiffSerie, ChunkSize):
+        Stats.update(Array)
+        SliceShape = Array.shape[1:]
+        Step += 1
+        if Progress:
+            Progress(Step / Steps)
+
+    # Get Info :
+    Spacing = (resolution, resolution, resolution)
+    Size = (SliceShape[1], SliceShape[0], len(TiffSerie))
+
+    Origin = (
+        -(Size[0]-1)/2*Spacing[0],
+        (Size[1]-1)/2*Spacing[1],
+        (Size[2]-1)/2*Spacing[2]
+        )
+
+    # Second pass : windowing into the uint8 nrrd
+    Wmin, Wmax = stats_window(Stats, Percentiles)
+    with open(Nrrd255Path, "wb") as wf:
+        write_nrrd_header(wf, Size, Spacing, Origin, Direction)
+        for start, Array in read_tiff_chunks(TiffSerie, ChunkSize):
+            Chunk255 = window_array(Array, Wmin, Wmax)
+            if Projections:
+                Projections.update(start, Chunk255)
+            wf.write(Chunk255.tobytes())
+            Step += 1
+            if Progress:
+                Progress(Step / Steps)
+
+    Image3D_255 = sitk.ReadImage(Nrrd255Path)
+
+    return Image3D_255, Spacing, Size, Origin, Stats, PixelType
+
+
 def read_nrrd_image(user_nrrd_path):
     reader = sitk.ImageFileReader()
     reader.SetFileName(user_nrrd_path)
@@ -214,15 +324,6 @@ def read_nrrd_image(user_nrrd_path):
     return Image3D, Spacing, Size, Origin
 
 
-def get_min_max(Image3D):
-    minmax = sitk.MinimumMaximumImageFilter()
-    minmax.Execute(Image3D)
-    Wmax = minmax.GetMaximum()
-    Wmin = minmax.GetMinimum()
-
-    return Wmin, Wmax
-
-
 def flatten_matrix(matrix):
     dim = len(matrix)
     return [matrix[j][i] for i in range(dim) for j in range(dim)]
@@ -261,13 +362,16 @@ def get_matrices(Origin, Direction, VCenter):
     return TransformMatrix, DirectionMatrix_4x4, TransMatrix_4x4, VtkTransform_4x4
 
 
-def create_image_info(UserProjectDir, Image3D, Spacing, Size,
-                      Origin, Direction, VCenter, INTACT_Props):
-
+def reserve_prefix(INTACT_Props):
     INTACT_Props.CT_ID = INTACT_Props.CT_ID + 1
-    Prefix = f"IT{INTACT_Props.CT_ID:03}"
+    return f"IT{INTACT_Props.CT_ID:03}"
+
 
-    Wmin, Wmax = get_min_max(Image3D)
+def create_image_info(UserProjectDir, Prefix, Meta, INTACT_Props):
+    """Add the image info of a loaded scan, from the metadata of its ingest"""
+    Spacing, Size, Origin = Meta["Spacing"], Meta["Size"], Meta["Origin"]
+    Direction, VCenter = Meta["Direction"], Meta["VolumeCenter"]
+    Wmin, Wmax = Meta["Window"]
 
     (TransformMatrix,
      DirectionMatrix_4x4,
@@ -285,13 +389,15 @@ def create_image_info(UserProjectDir, Image3D, Spacing, Size,
     image.name = Prefix
     image.UserProjectDir = utils.RelPath(UserProjectDir)
     image.Prefix = Prefix
-    image.RenderSz = Size
-    image.RenderSp = Spacing
-    image.PixelType = Image3D.GetPixelIDTypeAsString()
+    image.RenderSz = Meta["RenderSz"]
+    image.RenderSp = Meta["RenderSp"]
+    image.PixelType = Meta["PixelType"]
     image.Wmin = Wmin
     image.Wmax = Wmax
+    image.Stats = json.dumps(Meta["Stats"])
+    image.Stats255 = json.dumps(Meta["Stats255"])
     image.Size = Size
-    image.Dims = Image3D.GetDimension()
+    image.Dims = len(Size)
     image.Spacing = Spacing
     image.Origin = Origin
     image.Direction = Direction
@@ -303,26 +409,71 @@ def create_image_info(UserProjectDir, Image3D, Spacing, Size,
     image.SlicesDir = utils.RelPath(SlicesDir)
     image.Nrrd255Path = utils.RelPath(Nrrd255Path)
 
+    INTACT_Props.Wmin, INTACT_Props.Wmax = Meta["Window255"]
     INTACT_Props.UserProjectDir = utils.RelPath(INTACT_Props.UserProjectDir)
-    bpy.ops.wm.save_mainfile()
+    utils.MarkProjectDirty()
 
     return image
 
 
-def write_image(UserProjectDir, Image3D, ImageInfo, INTACT_Props,
-                rescale_intensity=True, resize_image=True):
+def crop_image(Image3D_255, Meta, Crop, Projections=None, CenterDirection=None):
+    """Crop the empty air around the object of a 0-255 image.
+
+    Crop is the (threshold, margin) of the bounding box, Projections the max
+    projections of the image if they were computed while reading it. The new
+    Size, Origin and VolumeCenter are stored in Meta, with the 0-255 statistics
+    of the cropped volume. CenterDirection is the direction the VolumeCenter
+    was computed with, Meta["Direction"] by default.
+    """
+    if Projections is None:
+        Projections = max_projections(sitk.GetArrayViewFromImage(Image3D_255))
+    Box = Projections.bounding_box(*Crop)
+    Size = Image3D_255.GetSize()
+    (z0, z1), (y0, y1), (x0, x1) = Box or ((0, Size[2]), (0, Size[1]), (0, Size[0]))
+    if (x1 - x0, y1 - y0, z1 - z0) == tuple(Size):
+        return Image3D_255
+
+    # Slicing keeps the physical position of the voxels, the origin follows :
+    Cropped = Image3D_255[x0:x1, y0:y1, z0:z1]
+    print(f"Image cropped from {Size} to {Cropped.GetSize()}")
+    Meta["Size"] = Cropped.GetSize()
+    Meta["Origin"] = Cropped.GetOrigin()
+    # The center moves by the offset of the box center, in the frame of the old center :
+    Offset = (np.array((x0, y0, z0)) + (np.array(Cropped.GetSize()) - 1) / 2
+              - (np.array(Size) - 1) / 2) * np.array(Meta["Spacing"])
+    D = np.array(CenterDirection or Meta["Direction"]).reshape(3, 3)
+    Meta["VolumeCenter"] = tuple(float(v) for v in np.array(Meta["VolumeCenter"]) + D @ Offset)
+    # The threshold default and the window only count the voxels that are kept :
+    Stats255 = volume_stats(sitk.GetArrayViewFromImage(Cropped))
+    Meta["Window255"] = (Stats255.Min, Stats255.Max)
+    Meta["Stats255"] = Stats255.to_dict()
+    return Cropped
+
+
+def write_image(Image3D, Meta, Nrrd255Path, rescale_intensity=True, BudgetBytes=None,
+                Crop=None, Projections=None, Streamed=False, CenterDirection=None):
+    """Window Image3D and write its nrrd, returns the render resolution volume.
+
+    Runs on the ingest thread : the render size/spacing are stored in Meta
+    instead of the scene properties. The image is cropped to the object first
+    when Crop is given (see crop_image), the render volume is reduced to fit
+    in BudgetBytes of slice textures (see render_volume). A Streamed image is
+    already windowed and written to Nrrd255Path, it is only written again
+    when cropped. CenterDirection is passed on to crop_image.
+    """
     # Set info in Image3D metadata:
-    Image3D.SetSpacing(ImageInfo.Spacing)
-    Image3D.SetDirection(ImageInfo.Direction)
-    Image3D.SetOrigin(ImageInfo.Origin)
+    Image3D.SetSpacing(Meta["Spacing"])
+    Image3D.SetDirection(Meta["Direction"])
+    Image3D.SetOrigin(Meta["Origin"])
 
     if rescale_intensity:
+        Wmin, Wmax = Meta["Window"]
         # set IntensityWindowing  :
         Image3D_255 = sitk.Cast(
             sitk.IntensityWindowing(
                 Image3D,
-                windowMinimum=ImageInfo.Wmin,
-                windowMaximum=ImageInfo.Wmax,
+                windowMinimum=Wmin,
+                windowMaximum=Wmax,
                 outputMinimum=0.0,
                 outputMaximum=255.0,
             ),
@@ -330,58 +481,120 @@ def write_image(UserProjectDir, Image3D, ImageInfo, INTACT_Props,
         )
     else:
         Image3D_255 = Image3D
-        print('Not rescaled')
+        if not Streamed:
+            print('Not rescaled')
 
-    Wmin, Wmax = get_min_max(Image3D_255)
-    INTACT_Props.Wmin = Wmin
-    INTACT_Props.Wmax = Wmax
+    if Crop:
+        Image3D_255 = crop_image(Image3D_255, Meta, Crop, Projections, CenterDirection)
 
     # Convert Dicom to nrrd file :
-    sitk.WriteImage(Image3D_255, utils.AbsPath(ImageInfo.Nrrd255Path))
-
-    if resize_image:
-        MaxSp = max(Vector(ImageInfo.Spacing))
-        if MaxSp < 0.25:
-            SampleRatio = round(MaxSp / 0.25, 2)
-            Image3D_255 = utils.ResizeImage(sitkImage=Image3D_255,
-                                            Ratio=SampleRatio)
-            ImageInfo.RenderSz = Image3D_255.GetSize()
-            ImageInfo.RenderSp = Image3D_255.GetSpacing()
-
-    PngDir = join(UserProjectDir, "PNG")
-    if not exists(PngDir):
-        os.makedirs(PngDir)
-
-    Array = sitk.GetArrayFromImage(Image3D_255)
-    slices = [np.flipud(Array[i, :, :]) for i in range(Array.shape[0])]
-
-    threads = [
-        threading.Thread(
-            target=Image3DToPNG,
-            args=[i, slices, PngDir, ImageInfo.Prefix],
-            daemon=True,
-        )
-        for i in range(len(slices))
-    ]
+    if not Streamed or Image3D_255 is not Image3D:
+        sitk.WriteImage(Image3D_255, Nrrd255Path)
+
+    return render_volume(Image3D_255, Meta, BudgetBytes)
+
+
+def render_volume(Image3D_255, Meta, BudgetBytes=None):
+    """Render resolution volume of the slice textures.
 
-    for t in threads:
-        t.start()
+    Per axis factors are picked so the textures fit in BudgetBytes, the image
+    is then reduced with a block mean, which keeps the extent of the volume.
+    """
+    Size, Spacing = tuple(Meta["Size"]), tuple(Meta["Spacing"])
+    Meta["RenderSz"], Meta["RenderSp"] = Size, Spacing
+    if not BudgetBytes:
+        return Image3D_255
 
-    for t in threads:
-        t.join()
+    Factors = utils.BudgetFactors(Size, Spacing, BudgetBytes, BytesPerVoxel=4)
+    if Factors == (1, 1, 1):
+        return Image3D_255
 
-    shutil.rmtree(PngDir)
+    Array = utils.BlockMeanReduce(sitk.GetArrayViewFromImage(Image3D_255), Factors)
+    Render = sitk.GetImageFromArray(Array)
+    RenderSz = Render.GetSize()
+    RenderSp = tuple(Size[i] * Spacing[i] / RenderSz[i] for i in range(3))
+    Render.SetSpacing(RenderSp)
+    print(f"Render volume reduced by {Factors} to {RenderSz}")
+    Meta["RenderSz"], Meta["RenderSp"] = RenderSz, RenderSp
+    return Render
 
 
-def Image3DToPNG(i, slices, PngDir, Prefix):
-    """MultiThreading PNG Writer"""
-    img_Slice = slices[i]
+def slice_texture_data(i, Slice, Prefix, Storage, TexturesDir):
+    """CPU side of the slice texture creation, safe to run on a worker thread.
+
+    Packed textures keep their uint8 slice, expanded to RGBA pixels only
+    when the image is created. External ones are flipped, encoded and
+    written to TexturesDir. No bpy data is touched here.
+    Returns the image name and its data.
+    """
     img_Name = f"{Prefix}_img{i:04}.png"
-    image_path = join(PngDir, img_Name)
-    cv2.imwrite(image_path, img_Slice)
-    image = bpy.data.images.load(image_path)
-    image.pack()
-    # print(f"{img_Name} was processed...")
+    if Storage == "PACKED":
+        return img_Name, (Slice.shape, Slice)
+
+    ImagePath = join(TexturesDir, img_Name)
+    cv2.imwrite(ImagePath, np.flipud(Slice), PNG_PARAMS)
+    return img_Name, (Slice.shape, ImagePath)
+
+
+def atlas_page(p, Array, Layout):
+    """uint8 atlas page p of a (z, y, x) volume, see utils.AtlasLayout.
+
+    Slices fill the page row by row from the bottom, every tile is padded
+    with a copy of its border pixels.
+    """
+    Cols, Rows, Pages = Layout
+    Count, Height, Width = Array.shape
+    TileH, TileW = Height + 2, Width + 2
+    Page = np.zeros((Rows * TileH, Cols * TileW), dtype=np.uint8)
+    First = p * Cols * Rows
+    for k, i in enumerate(range(First, min(First + Cols * Rows, Count))):
+        r, c = divmod(k, Cols)
+        Page[r * TileH:(r + 1) * TileH, c * TileW:(c + 1) * TileW] = np.pad(
+            Array[i], 1, mode="edge")
+    return Page
+
+
+def atlas_texture_data(p, Array, Layout, Prefix, Storage, TexturesDir):
+    """Worker side of an atlas page, like slice_texture_data.
+
+    Pages are always written to TexturesDir, packed ones are packed from
+    their PNG file : an RGBA float page would take 16 times the memory of
+    the page, about 1 GiB for an 8192 page.
+    """
+    img_Name = f"{Prefix}_atlas{p:02}.png"
+    Page = atlas_page(p, Array, Layout)
+    ImagePath = join(TexturesDir, img_Name)
+    cv2.imwrite(ImagePath, np.flipud(Page), PNG_PARAMS)
+    return img_Name, (Page.shape, ImagePath)
+
+
+def Image3DToBlender(img_Name, Data, Storage):
+    """Create the slice (or atlas page) image datablock, main thread only"""
+    (Height, Width), Payload = Data
+
+    if Storage == "PACKED" and isinstance(Payload, str):
+        # Atlas page or cached slice : the PNG bytes are packed, the file is not needed anymore
+        image = bpy.data.images.load(Payload)
+        image.name = img_Name
+        image.pack()
+        os.remove(Payload)
+    elif Storage == "PACKED":
+        image = bpy.data.images.new(img_Name, width=Width, height=Height, alpha=False)
+        image.pixels.foreach_set(utils.SlicePixels(Payload))
+        image.pack()
+    else:
+        image = bpy.data.images.load(utils.RelPath(Payload))
+        image.name = img_Name
+    image.colorspace_settings.name = "Non-Color"
+
+    return image
+
+
+def remove_slice_images(Prefix):
+    Names = (f"{Prefix}_img", f"{Prefix}_atlas", f"{Prefix}_lod", f"{Prefix}_axis",
+             f"{Prefix}_brick")
+    for image in [img for img in bpy.data.images if img.name.startswith(Names)]:
+        bpy.data.images.remove(image)
 
 
 def set_blender_properties():
@@ -413,77 +626,439 @@ def calculate_vcenter(Image3D, Size):
     return VCenter
 
 
-def load_image_function(context, q, imageType, imagePath):
-
-    INTACT_Props = context.scene.INTACT_Props
-    UserProjectDir = utils.AbsPath(INTACT_Props.UserProjectDir)
-    UserImagePath = utils.AbsPath(imagePath)
-
-    if not all_files_exist(UserProjectDir, UserImagePath, imageType):
-        return {"CANCELLED"}
-    else:
-        startTime = Tcounter()
-        save_blend_file(UserProjectDir)
+def ingest_settings(imageType, INTACT_Props):
+    """Settings that change the result of an ingest, part of the cache key"""
+    Settings = {"imageType": imageType}
+    if imageType == "TIFF":
+        Settings["Resolution"] = INTACT_Props.Resolution
+        Settings["StreamTiff"] = INTACT_Props.StreamTiffIngest
+    Settings["Window"] = window_percentiles(INTACT_Props)
+    Settings["Crop"] = crop_settings(INTACT_Props)
+    Settings["TextureBudget"] = texture_budget(INTACT_Props)
+    return Settings
+
+
+def texture_budget(INTACT_Props):
+    """Texture budget (MB) of the render volume, shared by its plane stacks"""
+    if INTACT_Props.ViewAlignedStacks and not INTACT_Props.BrickedVolume:
+        return INTACT_Props.TextureBudget / 3
+    return INTACT_Props.TextureBudget
+
+
+def crop_settings(INTACT_Props):
+    if INTACT_Props.AutoCrop:
+        return (INTACT_Props.AutoCropThreshold, INTACT_Props.AutoCropMargin)
+    return None
+
+
+def window_percentiles(INTACT_Props):
+    if INTACT_Props.WindowMode == "PERCENTILE":
+        return (INTACT_Props.WindowLowPercentile, INTACT_Props.WindowHighPercentile)
+    return None
+
+
+def render_mode(INTACT_Props):
+    """Volume render mode of a new scan, the texture atlas when OpenVDB is missing"""
+    if INTACT_Props.VolumeRenderMode == "VDB" and not vdb.available():
+        return "ATLAS"
+    return INTACT_Props.VolumeRenderMode
+
+
+def cache_dir(INTACT_Props):
+    """Ingest cache directory, the per user cache folder unless one is set"""
+    return utils.AbsPath(INTACT_Props.CacheDir) if INTACT_Props.CacheDir else cache.default_cache_dir()
+
+
+class ScanIngest:
+    """Background ingest of a scan.
+
+    Cache lookup, reading, windowing, nrrd writing, cache store and the CPU
+    side of the slice textures run on a worker thread. The slice texture data
+    is handed through the bounded Textures queue to the main thread, which
+    creates the image datablocks (create_textures). The job thread never
+    touches bpy data : the scene settings are copied when the job is created.
+    """
+
+    def __init__(self, imageType, UserImagePath, UserProjectDir, Prefix, INTACT_Props):
+        self.imageType = imageType
+        self.UserImagePath = UserImagePath
+        self.UserProjectDir = UserProjectDir
+        self.Prefix = Prefix
+        self.Nrrd255Path = join(UserProjectDir, f"{Prefix}_Image3D255.nrrd")
+        # One texture store per scan, removed as a whole when the scan load fails or is cancelled :
+        self.TexturesDir = join(UserProjectDir, "Textures", Prefix)
+
+        self.Resolution = INTACT_Props.Resolution
+        self.StreamTiff = INTACT_Props.StreamTiffIngest
+        self.ChunkSize = INTACT_Props.IngestChunkSlices
+        self.Storage = INTACT_Props.SliceTextureStorage
+        self.RenderMode = render_mode(INTACT_Props)
+        # A VDB volume has no plane stacks :
+        Stacks = self.RenderMode != "VDB"
+        self.VdbPath = None if Stacks else vdb.vdb_path(UserProjectDir, Prefix)
+        self.LodLevels = INTACT_Props.LodLevels if Stacks else 0
+        # Bricks are Z stacks only :
+        self.ViewStacks = Stacks and INTACT_Props.ViewAlignedStacks and not INTACT_Props.BrickedVolume
+        self.BrickSize = INTACT_Props.BrickSize if Stacks and INTACT_Props.BrickedVolume else 0
+        self.EmptyVoxelFloor = INTACT_Props.EmptySpaceFloor
+        self.EmptyFloor = INTACT_Props.EmptySpaceFloor if INTACT_Props.SkipEmptySpace else None
+        self.Percentiles = window_percentiles(INTACT_Props)
+        self.Crop = crop_settings(INTACT_Props)
+        self.BudgetBytes = texture_budget(INTACT_Props) * 1024 ** 2
+        self.Settings = ingest_settings(imageType, INTACT_Props)
+        self.UseCache = INTACT_Props.UseIngestCache
+        self.CacheDir = cache_dir(INTACT_Props)
+        self.CacheSizeLimit = INTACT_Props.CacheSizeLimit * 1024 ** 3
+        self.ContentHash = INTACT_Props.CacheContentHash
+
+        # Image metadata, same keys as the ingest cache meta :
+        self.Meta = None
+        self.Textures = Queue(maxsize=16)
+        self.TexturesCount = 0
+        self.TexturesDone = 0
+        self.Footprints = None
+        self.Bricks = None
+        self.Progress = 0.0
+        self.Status = "Starting..."
+        self.Error = None
+        self.Cancel = threading.Event()
+        self.Finished = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            self.ingest()
+        except IngestCancelled:
+            print("Loading cancelled")
+        except Exception as Error:
+            traceback.print_exc()
+            self.Error = Error
+        finally:
+            self.Finished.set()
+
+    @property
+    def cancelled(self):
+        return self.Cancel.is_set()
+
+    def remove_files(self):
+        """Remove the files written by a failed or cancelled job"""
+        if exists(self.Nrrd255Path):
+            os.remove(self.Nrrd255Path)
+        if self.VdbPath and exists(self.VdbPath):
+            os.remove(self.VdbPath)
+        if exists(self.TexturesDir):
+            rmtree(self.TexturesDir)
+
+    def discard(self):
+        """Cancel a job that will not be finished, its files are removed once it stops"""
+        self.Cancel.set()
+
+        def RemoveWhenStopped():
+            self.Finished.wait()
+            self.remove_files()
+
+        threading.Thread(target=RemoveWhenStopped, daemon=True).start()
+
+    @property
+    def done(self):
+        # The queue is only filled before Finished is set :
+        return self.Finished.is_set() and self.Textures.empty()
+
+    def progress(self):
+        if self.TexturesCount:
+            return 0.6 + 0.4 * self.TexturesDone / self.TexturesCount
+        return self.Progress
+
+    def report(self, Progress, Status=None):
+        """Update the job progress, raises IngestCancelled once cancel is requested"""
+        if self.Cancel.is_set():
+            raise IngestCancelled
+        self.Progress = Progress
+        if Status:
+            self.Status = Status
+
+    def ingest(self):
+        Key = EntryDir = None
+        if self.UseCache:
+            self.report(0.0, "Checking ingest cache...")
+            Key = cache.fingerprint(self.UserImagePath, self.Settings, self.ContentHash)
+            EntryDir = cache.lookup(self.CacheDir, Key)
+
+        if EntryDir:
+            print("Scan found in ingest cache")
+            self.Meta = cache.read_meta(EntryDir)
+            shutil.copyfile(join(EntryDir, cache.NRRD_FILE), self.Nrrd255Path)
+            if not self.read_cached_textures(EntryDir):
+                self.write_textures(cache.load_render_volume(EntryDir), EntryDir)
+            return
+
+        Render255 = self.read_image()
+        Array = sitk.GetArrayViewFromImage(Render255)
+        if Key:
+            self.report(0.55, "Storing in ingest cache...")
+            EntryDir = cache.store(self.CacheDir, Key, self.Nrrd255Path, Array, self.Meta,
+                                   self.CacheSizeLimit)
+        self.write_textures(Array, EntryDir)
+
+    def read_image(self):
+        """Read the source image, window it and write its nrrd.
+        Returns the render resolution uint8 volume"""
+        self.report(0.05, f"Reading {self.imageType}...")
         rescale_intensity = True
-        resize_image = True
+        # Set when the read image is already windowed to 0-255 :
+        Windowed = False
+        Stats = PixelType = Projections = CenterDirection = None
 
-        if imageType == "DICOM":
+        if self.imageType == "DICOM":
             (Image3D,
              Spacing,
              Size,
-             Origin) = read_dicom_image(UserImagePath)
+             Origin) = read_dicom_image(self.UserImagePath, self.UserProjectDir)
 
             VCenter = calculate_vcenter(Image3D, Size)
+            # The center is in the frame of the DICOM direction, not of the one written :
+            CenterDirection = Image3D.GetDirection()
             Direction = (1.0, 0.0, 0.0, 0.0, -1.0, 0.0, 0.0, 0.0, -1.0)
 
-        elif imageType == "TIFF":
+        elif self.imageType == "TIFF" and self.StreamTiff:
+            if self.Crop:
+                Projections = MaxProjections(len(os.listdir(self.UserImagePath)))
+            Direction = (1.0, 0.0, 0.0, 0.0, -1.0, 0.0, 0.0, 0.0, -1.0)
             (Image3D,
              Spacing,
              Size,
-             Origin) = read_tiff_image(UserImagePath, INTACT_Props.Resolution)
+             Origin,
+             Stats,
+             PixelType) = read_tiff_image_streaming(
+                self.UserImagePath, self.Resolution, self.ChunkSize,
+                self.Nrrd255Path, Direction,
+                Progress=lambda Ratio: self.report(0.05 + 0.35 * Ratio),
+                Percentiles=self.Percentiles,
+                Projections=Projections)
+            VCenter = (0.0, 0.0, 0.0)
+            rescale_intensity = False
+            Windowed = True
+
+        elif self.imageType == "TIFF":
+            (Image3D,
+             Spacing,
+             Size,
+             Origin) = read_tiff_image(self.UserImagePath, self.Resolution)
             VCenter = (0.0, 0.0, 0.0)
             Direction = (1.0, 0.0, 0.0, 0.0, -1.0, 0.0, 0.0, 0.0, -1.0)
-            resize_image = False
 
-        elif imageType == "NRRD" and is_image_supported(UserImagePath):
+        else:
             (Image3D,
              Spacing,
              Size,
-             Origin) = read_nrrd_image(UserImagePath)
+             Origin) = read_nrrd_image(self.UserImagePath)
 
             VCenter = calculate_vcenter(Image3D, Size)
             Direction = Image3D.GetDirection()
-            if is_intact_nrrd(UserImagePath):
+            if is_intact_nrrd(self.UserImagePath):
                 rescale_intensity = False
 
+        if Stats is None:
+            self.report(0.3, "Computing volume statistics...")
+            Stats = volume_stats(sitk.GetArrayViewFromImage(Image3D))
+        # The 0-255 statistics follow from the source histogram, unless the
+        # source is an INTACT nrrd, already 0-255 :
+        if rescale_intensity or Windowed:
+            Window = stats_window(Stats, self.Percentiles)
+            Stats255 = Stats.windowed(*Window)
         else:
-            return {"CANCELLED"}
-
-        ImageInfo = create_image_info(UserProjectDir, Image3D, Spacing, Size,
-                                      Origin, Direction, VCenter, INTACT_Props)
-        write_image(UserProjectDir, Image3D, ImageInfo, INTACT_Props,
-                    rescale_intensity, resize_image)
-        ImageInfo.CT_Loaded = True
-
-        finishTime = Tcounter()
-        message = f"Data Loaded in {finishTime-startTime} seconds"
-        print(message)
-        # q.put(message)
-
-        if (imageType != "NRRD"):
-            message = [f"{imageType} loaded successfully. "]
-            utils.ShowMessageBox(message=message, icon="COLORSET_03_VEC")
-
-        set_blender_properties()
+            Window = (Stats.Min, Stats.Max)
+            Stats255 = Stats
+
+        self.report(0.4, "Windowing and writing nrrd...")
+        self.Meta = {
+            "Spacing": tuple(Spacing),
+            "Size": tuple(Size),
+            "Origin": tuple(Origin),
+            "Direction": tuple(Direction),
+            "VolumeCenter": tuple(VCenter),
+            "Window": Window,
+            "PixelType": PixelType or Image3D.GetPixelIDTypeAsString(),
+            "Window255": (Stats255.Min, Stats255.Max),
+            "Stats": Stats.to_dict(),
+            "Stats255": Stats255.to_dict(),
+        }
+        return write_image(Image3D, self.Meta, self.Nrrd255Path,
+                           rescale_intensity, self.BudgetBytes, self.Crop, Projections,
+                           Streamed=Windowed, CenterDirection=CenterDirection)
+
+    def texture_tasks(self, Shape):
+        """Textures made for a (z, y, x) volume : atlas pages or slices"""
+        if self.RenderMode == "ATLAS":
+            return range(utils.AtlasLayout(*Shape)[2])
+        return range(Shape[0])
+
+    def stack_axes(self):
+        return tuple(utils.STACK_AXES) if self.ViewStacks else ("Z",)
+
+    def texture_settings(self):
+        """Settings that change the textures made from a render volume, part of
+        their key in the ingest cache"""
+        return {
+            "RenderMode": self.RenderMode,
+            "LodLevels": self.LodLevels,
+            "ViewStacks": self.ViewStacks,
+            "BrickSize": self.BrickSize,
+            "EmptyVoxelFloor": self.EmptyVoxelFloor if self.BrickSize else None,
+            "EmptyFloor": self.EmptyFloor,
+        }
+
+    def texture_files(self):
+        """True when the textures are written to TexturesDir, and can be cached.
+        Packed slices are handed to the main thread in memory"""
+        return self.RenderMode == "ATLAS" or (
+            self.RenderMode == "SLICES" and self.Storage == "EXTERNAL")
+
+    def read_cached_textures(self, EntryDir):
+        """Queue the texture files of a cache entry, copied to TexturesDir, instead
+        of building them again. Returns False when the entry has none for the
+        current texture settings"""
+        if self.RenderMode == "VDB":
+            return False
+        TexDir, TexturesMeta = cache.lookup_textures(
+            EntryDir, cache.texture_key(self.texture_settings()))
+        if not TexDir:
+            return False
+
+        self.report(0.6, "Copying cached slice textures...")
+        if not exists(self.TexturesDir):
+            os.makedirs(self.TexturesDir)
+        self.Footprints = TexturesMeta["Footprints"]
+        self.Bricks = TexturesMeta["Bricks"]
+        Textures = TexturesMeta["Textures"]
+        self.TexturesCount = len(Textures)
+        # Cached names have no scan prefix :
+        for Suffix, Height, Width in Textures:
+            img_Name = f"{self.Prefix}{Suffix}"
+            ImagePath = join(self.TexturesDir, img_Name)
+            shutil.copyfile(join(TexDir, Suffix), ImagePath)
+            while True:
+                self.report(self.Progress)
+                try:
+                    self.Textures.put((img_Name, ((Height, Width), ImagePath)), timeout=0.1)
+                    break
+                except Full:
+                    pass
+        return True
 
-        return ImageInfo
+    def write_textures(self, Array, EntryDir=None):
+        """Prepare the slice textures (or atlas pages) of a (z, y, x) uint8 render
+        volume, of its X and Y stacks or of its bricks, and of its LOD volumes,
+        and queue them for the main thread. A VDB render writes its grid instead.
+        Texture files are also added to the ingest cache entry EntryDir"""
+        if self.RenderMode == "VDB":
+            self.report(0.6, "Writing OpenVDB volume...")
+            Active = vdb.write_vdb(Array, self.Meta["RenderSp"], self.EmptyVoxelFloor, self.VdbPath)
+            print(f"OpenVDB volume written, {Active} active voxels of {Array.size}")
+            return
+
+        if self.BrickSize:
+            self.report(0.58, "Finding occupied bricks...")
+            self.Bricks = occupied_bricks(Array, self.BrickSize, self.EmptyVoxelFloor)
+            Stacks = [(f"{self.Prefix}_brick{b:04}", Array[z0:z1, y0:y1, x0:x1])
+                      for b, (x0, y0, z0, x1, y1, z1) in enumerate(self.Bricks)]
+        else:
+            if self.EmptyFloor is not None:
+                self.report(0.58, "Trimming empty space...")
+                self.Footprints = {
+                    Axis: slice_footprints(utils.StackArray(Array, Axis), self.EmptyFloor)
+                    for Axis in self.stack_axes()
+                }
+            Stacks = [(utils.StackImagesPrefix(self.Prefix, Axis), utils.StackArray(Array, Axis))
+                      for Axis in self.stack_axes()]
+
+        self.report(0.6, "Building slice textures...")
+        if (self.Storage == "EXTERNAL" or self.RenderMode == "ATLAS") and not exists(self.TexturesDir):
+            os.makedirs(self.TexturesDir)
+
+        self.TexturesCount = sum(len(self.texture_tasks(Stack.shape)) for _, Stack in Stacks)
+        Shape = Array.shape
+        for Level in range(self.LodLevels):
+            Shape = tuple(-(-n // 2) for n in Shape)
+            self.TexturesCount += len(self.texture_tasks(Shape))
+
+        CacheTextures = None
+        if EntryDir and self.texture_files():
+            CacheTextures = (cache.begin_textures(
+                EntryDir, cache.texture_key(self.texture_settings())), [])
+
+        for ImagesPrefix, Stack in Stacks:
+            self.write_level_textures(ImagesPrefix, Stack, CacheTextures)
+        # Every LOD is a 2x block mean of the previous one (see utils.LodSize) :
+        for Level in range(1, self.LodLevels + 1):
+            Array = utils.BlockMeanReduce(Array, (2, 2, 2))
+            self.write_level_textures(f"{self.Prefix}_lod{Level}", Array, CacheTextures)
+
+        if CacheTextures:
+            TmpDir, Textures = CacheTextures
+            cache.commit_textures(TmpDir, {"Textures": Textures,
+                                           "Footprints": self.Footprints,
+                                           "Bricks": self.Bricks})
+            cache.evict(cache.cache_root(self.CacheDir), self.CacheSizeLimit,
+                        Keep=os.path.basename(EntryDir))
+
+    def write_level_textures(self, ImagesPrefix, Array, CacheTextures=None):
+        """Build the textures of Array on the worker pool, named after ImagesPrefix.
+        CacheTextures is the (folder, list) the texture files are copied and
+        listed to, see cache.begin_textures"""
+        Tasks = self.texture_tasks(Array.shape)
+        if self.RenderMode == "ATLAS":
+            Layout = utils.AtlasLayout(*Array.shape)
+
+            def Worker(p):
+                return atlas_texture_data(p, Array, Layout, ImagesPrefix, self.Storage,
+                                          self.TexturesDir)
+        else:
+            def Worker(i):
+                # X and Y stack slices are strided views of the volume :
+                return slice_texture_data(i, np.ascontiguousarray(Array[i, :, :]), ImagesPrefix,
+                                          self.Storage, self.TexturesDir)
+
+        def Consumer(Task, Texture):
+            if CacheTextures:
+                # Before queuing : packed atlas pages are removed once packed
+                img_Name, ((Height, Width), ImagePath) = Texture
+                Suffix = img_Name[len(self.Prefix):]
+                cache.add_texture(CacheTextures[0], Suffix, ImagePath)
+                CacheTextures[1].append((Suffix, Height, Width))
+            # Wait for the main thread to make room, but keep listening to cancel :
+            while True:
+                self.report(self.Progress)
+                try:
+                    self.Textures.put(Texture, timeout=0.1)
+                    return
+                except Full:
+                    pass
+
+        utils.RunWorkerPool(Worker, Tasks, Consumer)
+
+    def create_textures(self, TimeBudget):
+        """Create the queued slice images for at most TimeBudget seconds, main thread only"""
+        Start = Tcounter()
+        while Tcounter() - Start < TimeBudget:
+            try:
+                img_Name, Data = self.Textures.get_nowait()
+            except Empty:
+                return
+            if not self.cancelled:
+                Image3DToBlender(img_Name, Data, self.Storage)
+                self.TexturesDone += 1
 
 
 def set_scale_mm():
     bpy.context.scene.unit_settings.scale_length = 0.001
     bpy.context.scene.unit_settings.length_unit = "MILLIMETERS"
     bpy.ops.view3d.view_selected(use_all_regions=False)
-    bpy.ops.wm.save_mainfile()
+    utils.MarkProjectDirty()
 
 
 class INTACT_OT_Volume_Render(bpy.types.Operator):
@@ -493,11 +1068,153 @@ class INTACT_OT_Volume_Render(bpy.types.Operator):
     bl_label = "LOAD CT SCAN"
 
     q = Queue()
+    # Running ingest job, only one scan is loaded at a time :
+    Job = None
 
-    def execute(self, context):
+    @classmethod
+    def poll(cls, context):
+        return INTACT_OT_Volume_Render.Job is None
 
-        Start = Tcounter()
+    @staticmethod
+    def discard_job():
+        """Drop the running job without finishing it, the scan can be loaded again"""
+        Job = INTACT_OT_Volume_Render.Job
+        INTACT_OT_Volume_Render.Job = None
+        if Job:
+            Job.discard()
+
+    def start_job(self, context):
+
+        INTACT_Props = context.scene.INTACT_Props
+        Sources = {
+            "TIFF Stack": ("TIFF", INTACT_Props.UserTiffDir),
+            "DICOM Series": ("DICOM", INTACT_Props.UserDcmDir),
+            "NRRD File": ("NRRD", INTACT_Props.UserImageFile),
+        }
+        imageType, imagePath = Sources[INTACT_Props.DataType]
+        UserProjectDir = utils.AbsPath(INTACT_Props.UserProjectDir)
+        UserImagePath = utils.AbsPath(imagePath)
+
+        if not all_files_exist(UserProjectDir, UserImagePath, imageType):
+            return None
+        if imageType == "NRRD" and not is_image_supported(UserImagePath):
+            return None
+        if render_mode(INTACT_Props) != INTACT_Props.VolumeRenderMode:
+            message = ["The OpenVDB python module is not available in this Blender,",
+                       "the volume is rendered with a texture atlas instead."]
+            utils.ShowMessageBox(message=message, icon="COLORSET_02_VEC")
+
+        self.Start = Tcounter()
         print("Data Loading START...")
+        save_blend_file(UserProjectDir)
+
+        Prefix = reserve_prefix(INTACT_Props)
+        Job = ScanIngest(imageType, UserImagePath, UserProjectDir, Prefix, INTACT_Props)
+        INTACT_OT_Volume_Render.Job = Job
+        Job.start()
+        return Job
+
+    def invoke(self, context, event):
+
+        if not self.start_job(context):
+            return {"CANCELLED"}
+
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self._timer = wm.event_timer_add(0.1, window=context.window)
+        wm.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def modal(self, context, event):
+
+        Job = INTACT_OT_Volume_Render.Job
+
+        if event.type == "ESC":
+            Job.Cancel.set()
+            return {"RUNNING_MODAL"}
+        if event.type != "TIMER":
+            return {"PASS_THROUGH"}
+
+        # Keep the UI responsive : only a few slice images per timer tick
+        Job.create_textures(TimeBudget=0.05)
+
+        wm = context.window_manager
+        if not Job.done:
+            Percent = int(Job.progress() * 100)
+            wm.progress_update(Percent)
+            Status = "Cancelling..." if Job.cancelled else f"{Job.Status} {Percent}%"
+            context.workspace.status_text_set(f"INTACT : {Status} (Esc to cancel)")
+            return {"RUNNING_MODAL"}
+
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+        return self.finish(context)
+
+    def cancel(self, context):
+        # Modal ended by Blender, when a file is opened or the window closed :
+        self.discard_job()
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        if context.workspace:
+            context.workspace.status_text_set(None)
+
+    def execute(self, context):
+        # Blocking load, for scripts :
+        Job = self.start_job(context)
+        if not Job:
+            return {"CANCELLED"}
+
+        while not Job.done:
+            Job.create_textures(TimeBudget=0.05)
+            Job.Finished.wait(0.01)
+
+        Result = self.finish(context)
+        # A script may exit right after, the save timer would never run :
+        utils.SaveProject()
+        return Result
+
+    def finish(self, context):
+
+        Job = INTACT_OT_Volume_Render.Job
+        INTACT_OT_Volume_Render.Job = None
+        INTACT_Props = context.scene.INTACT_Props
+
+        if Job.Error or Job.cancelled:
+            remove_slice_images(Job.Prefix)
+            Job.remove_files()
+            utils.MarkProjectClean()
+
+            if isinstance(Job.Error, IngestError):
+                message = Job.Error.message
+            elif Job.Error:
+                message = [f"Loading failed : {Job.Error}"]
+            else:
+                message = ["Loading cancelled"]
+            utils.ShowMessageBox(message=message, icon="COLORSET_01_VEC")
+            return {"CANCELLED"}
+
+        ImageInfo = create_image_info(Job.UserProjectDir, Job.Prefix, Job.Meta, INTACT_Props)
+        ImageInfo.RenderMode = Job.RenderMode
+        ImageInfo.LodLevels = Job.LodLevels
+        ImageInfo.ViewStacks = Job.ViewStacks
+        ImageInfo.Bricks = json.dumps(Job.Bricks) if Job.Bricks is not None else ""
+        ImageInfo.VdbPath = utils.RelPath(Job.VdbPath) if Job.VdbPath else ""
+        ImageInfo.Footprints = json.dumps(Job.Footprints) if Job.Footprints else ""
+        ImageInfo.CT_Loaded = True
+        # Packed atlas pages were staged there :
+        if Job.Storage == "PACKED" and exists(Job.TexturesDir):
+            rmtree(Job.TexturesDir)
+
+        message = f"Data Loaded in {Tcounter()-self.Start} seconds"
+        print(message)
+
+        if (Job.imageType != "NRRD"):
+            message = [f"{Job.imageType} loaded successfully. "]
+            utils.ShowMessageBox(message=message, icon="COLORSET_03_VEC")
+
+        set_blender_properties()
 
         GpShader = "VGS_INTACT"
         GpThreshold = "VGS_Threshold"
@@ -505,22 +1222,6 @@ class INTACT_OT_Volume_Render(bpy.types.Operator):
         ShadersBlendFile = join(addon_dir, "Resources", "BlendData",
                                 "INTACT_BlendData.blend")
 
-        INTACT_Props = context.scene.INTACT_Props
-
-        DataType = INTACT_Props.DataType
-        if DataType == "TIFF Stack":
-            ImageInfo = load_image_function(context, self.q, "TIFF",
-                                            INTACT_Props.UserTiffDir)
-        if DataType == "DICOM Series":
-            ImageInfo = load_image_function(context, self.q, "DICOM",
-                                            INTACT_Props.UserDcmDir)
-        if DataType == "NRRD File":
-            ImageInfo = load_image_function(context, self.q, "NRRD",
-                                            INTACT_Props.UserImageFile)
-
-        if ImageInfo == {"CANCELLED"}:
-            return {"CANCELLED"}
-
         Wmin = INTACT_Props.Wmin
         Wmax = INTACT_Props.Wmax
 
@@ -536,8 +1237,12 @@ class INTACT_OT_Volume_Render(bpy.types.Operator):
         INTACT_Props.ThresholdGroupNodeName = GpThreshold
 
         GpNode = bpy.data.node_groups.get(GpThreshold)
+        # Threshold default separating the object from the background :
+        Threshold = round(VolumeStats.from_dict(Job.Meta["Stats255"]).otsu())
+        Threshold = min(max(Threshold, 0), 255)
+        INTACT_Props.Threshold = Threshold
         Low_Treshold = GpNode.nodes["Low_Treshold"].outputs[0]
-        Low_Treshold.default_value = 100
+        Low_Treshold.default_value = Threshold
         WminNode = GpNode.nodes["WminNode"].outputs[0]
         WminNode.default_value = Wmin
         WmaxNode = GpNode.nodes["WmaxNode"].outputs[0]
@@ -550,9 +1255,12 @@ class INTACT_OT_Volume_Render(bpy.types.Operator):
             if obj.name.startswith("IT") and obj.name.endswith("_CTVolume"):
                 INTACT_Props.CT_Vol = obj
 
+        # Single save of every stage, once the UI has caught up :
+        utils.SaveProjectLater()
+
         Finish = Tcounter()
 
-        print(f"Finished (Time : {Finish-Start}")
+        print(f"Finished (Time : {Finish-self.Start}")
 
         return {"FINISHED"}
 
@@ -600,6 +1308,7 @@ class INTACT_OT_Surface_Render(bpy.types.Operator):
         for obj in bpy.context.scene.objects:
             if obj.name.startswith("IT_surface_"):
                 INTACT_Props.Surf_3D = obj
+        utils.SaveProject()
 
         print(f"Finished (Time : {Finish-Start}")
 
@@ -616,6 +1325,12 @@ classes = [
 ]
 
 
+@persistent
+def DiscardIngest(*args):
+    """A scan being loaded belongs to the file it was started in"""
+    INTACT_OT_Volume_Render.discard_job()
+
+
 def register():
 
     for cls in classes:
@@ -625,6 +1340,7 @@ def register():
         "AxialSliceUpdate",
         "CoronalSliceUpdate",
         "SagitalSliceUpdate",
+        "SlicesDepsgraphUpdate",
     ]
 
     # Remove old handlers :
@@ -633,13 +1349,20 @@ def register():
         for h in handlers_To_Remove:
             bpy.app.handlers.depsgraph_update_post.remove(h)
 
-    handlers_To_Add = [
-        utils.AxialSliceUpdate,
-        utils.CoronalSliceUpdate,
-        utils.SagitalSliceUpdate,
-    ]
-    for h in handlers_To_Add:
-        post_handlers.append(h)
+    post_handlers.append(utils.SlicesDepsgraphUpdate)
+
+    load_handlers = bpy.app.handlers.load_post
+    for h in [h for h in load_handlers if h.__name__ == "SlicesLoadPost"]:
+        load_handlers.remove(h)
+    load_handlers.append(utils.SlicesLoadPost)
+    for h in [h for h in load_handlers if h.__name__ == "ProjectLoadPost"]:
+        load_handlers.remove(h)
+    load_handlers.append(utils.ProjectLoadPost)
+
+    pre_handlers = bpy.app.handlers.load_pre
+    for h in [h for h in pre_handlers if h.__name__ == "DiscardIngest"]:
+        pre_handlers.remove(h)
+    pre_handlers.append(DiscardIngest)
 
 
 def unregister():
@@ -649,6 +1372,7 @@ def unregister():
         "AxialSliceUpdate",
         "CoronalSliceUpdate",
         "SagitalSliceUpdate",
+        "SlicesDepsgraphUpdate",
     ]
     handlers_To_Remove = [h for h in post_handlers if h.__name__ in MyPostHandlers]
 
@@ -656,5 +1380,14 @@ def unregister():
         for h in handlers_To_Remove:
             bpy.app.handlers.depsgraph_update_post.remove(h)
 
+    load_handlers = bpy.app.handlers.load_post
+    for h in [h for h in load_handlers if h.__name__ in ("SlicesLoadPost", "ProjectLoadPost")]:
+        load_handlers.remove(h)
+    pre_handlers = bpy.app.handlers.load_pre
+    for h in [h for h in pre_handlers if h.__name__ == "DiscardIngest"]:
+        pre_handlers.remove(h)
+    if bpy.app.timers.is_registered(utils.SliceResultsTimer):
+        bpy.app.timers.unregister(utils.SliceResultsTimer)
+
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
@@ -0,0 +1,254 @@
+# Python imports :
+import json
+import numpy as np
+
+#######################################################################################
+# Volume statistics :
+# min, max, histogram and percentiles of a volume, computed in a single streaming pass
+# over its chunks. The histogram has a fixed number of bins, its range grows by
+# merging neighbouring bins when a chunk falls outside of it, so the range of the
+# volume does not have to be known before the pass.
+#######################################################################################
+
+BINS = 4096
+# Voxels per bincount call, bounds the memory of the index arrays :
+BLOCK_VOXELS = 1 << 24
+
+
+class VolumeStats:
+    """Streaming statistics of a volume : update() every chunk, then query"""
+
+    def __init__(self, Bins=BINS):
+        self.Bins = Bins
+        self.Counts = np.zeros(Bins, dtype=np.int64)
+        self.Lo = 0.0
+        self.Width = 0.0
+        self.Min = np.inf
+        self.Max = -np.inf
+        self.Count = 0
+        self.Sum = 0.0
+
+    @property
+    def empty(self):
+        return self.Count == 0
+
+    def update(self, Array):
+        """Add the voxels of Array, a (z, y, x) chunk or a whole volume"""
+        Array = np.asarray(Array)
+        if Array.size == 0:
+            return
+        Step = max(1, BLOCK_VOXELS // max(1, Array[0].size))
+        for start in range(0, Array.shape[0], Step):
+            self.update_block(Array[start:start + Step])
+
+    def update_block(self, Block):
+        Min, Max = float(Block.min()), float(Block.max())
+        if self.empty:
+            self.Lo = Min
+            if np.issubdtype(Block.dtype, np.integer):
+                # Unit bins keep the histogram of small integer ranges exact
+                self.Width = 1.0
+            else:
+                self.Width = (Max - Min) / (self.Bins - 1) or 1.0
+        self.grow(Min, Max)
+
+        Index = (Block.astype(np.float64) - self.Lo) / self.Width
+        Index = np.clip(Index, 0, self.Bins - 1).astype(np.intp)
+        self.Counts += np.bincount(Index.ravel(), minlength=self.Bins)
+
+        self.Min = min(self.Min, Min)
+        self.Max = max(self.Max, Max)
+        self.Count += Block.size
+        self.Sum += float(Block.sum(dtype=np.float64))
+
+    def grow(self, Min, Max):
+        """Merge bins pairwise until [Min, Max] fits in the histogram range"""
+        Half = self.Bins // 2
+        while Min < self.Lo:
+            Folded = self.Counts.reshape(Half, 2).sum(axis=1)
+            self.Counts = np.concatenate([np.zeros(Half, dtype=np.int64), Folded])
+            self.Lo -= self.Bins * self.Width
+            self.Width *= 2
+        while Max >= self.Lo + self.Bins * self.Width:
+            Folded = self.Counts.reshape(Half, 2).sum(axis=1)
+            self.Counts = np.concatenate([Folded, np.zeros(Half, dtype=np.int64)])
+            self.Width *= 2
+
+    @property
+    def mean(self):
+        return self.Sum / self.Count if self.Count else 0.0
+
+    def edges(self):
+        return self.Lo + self.Width * np.arange(self.Bins + 1)
+
+    def percentile(self, Percent):
+        """Value below which Percent % of the voxels fall, interpolated in its bin"""
+        if self.empty:
+            return 0.0
+        if Percent <= 0:
+            return self.Min
+        if Percent >= 100:
+            return self.Max
+        Cumulative = np.cumsum(self.Counts)
+        Target = self.Count * Percent / 100.0
+        Bin = int(np.searchsorted(Cumulative, Target))
+        Before = Cumulative[Bin - 1] if Bin else 0
+        Ratio = (Target - Before) / max(self.Counts[Bin], 1)
+        Value = self.Lo + (Bin + Ratio) * self.Width
+        return float(min(max(Value, self.Min), self.Max))
+
+    def windowed(self, Wmin, Wmax):
+        """Statistics of the uint8 volume windowed from [Wmin, Wmax] to 0-255,
+        derived from the histogram without reading the voxels again"""
+        Scale = 255.0 / (Wmax - Wmin) if Wmax > Wmin else 0.0
+
+        def Window(Values):
+            return np.clip((np.asarray(Values, dtype=np.float64) - Wmin) * Scale, 0, 255)
+
+        Stats = VolumeStats(Bins=256)
+        Stats.Width = 1.0
+        if self.empty:
+            return Stats
+        Lower = self.Lo + np.arange(self.Bins) * self.Width
+        Levels = Window(np.clip(Lower, self.Min, self.Max)).astype(np.intp)
+        Stats.Counts = np.bincount(Levels, weights=self.Counts, minlength=256).astype(np.int64)
+        # The extremes are exact, windowing is monotonic :
+        Stats.Min, Stats.Max = (float(v) for v in Window([self.Min, self.Max]).astype(np.uint8))
+        Stats.Count = self.Count
+        Stats.Sum = float(np.dot(Stats.Counts, np.arange(256)))
+        return Stats
+
+    def otsu(self, Default=100.0):
+        """Otsu threshold of the histogram, the value separating its two classes best.
+        Default when the histogram has a single class (a constant volume)"""
+        if self.empty:
+            return Default
+        Counts = self.Counts.astype(np.float64)
+        Centers = self.Lo + (np.arange(self.Bins) + 0.5) * self.Width
+        Weight0 = np.cumsum(Counts)
+        Weight1 = self.Count - Weight0
+        Sum0 = np.cumsum(Counts * Centers)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            Mean0 = Sum0 / Weight0
+            Mean1 = (Sum0[-1] - Sum0) / Weight1
+            Between = Weight0 * Weight1 * (Mean0 - Mean1) ** 2
+        Between = np.nan_to_num(Between)
+        if Between.max() <= 0:
+            return Default
+        # Middle of the plateau when the classes are separated by empty bins :
+        Best = np.flatnonzero(Between >= Between.max())
+        Bin = (Best[0] + Best[-1]) / 2
+        return float(min(max(self.Lo + (Bin + 1) * self.Width, self.Min), self.Max))
+
+    def to_dict(self):
+        # Only the used part of the histogram is stored :
+        Used = np.flatnonzero(self.Counts)
+        First, Last = (int(Used[0]), int(Used[-1]) + 1) if Used.size else (0, 0)
+        return {
+            "Bins": self.Bins,
+            "Lo": self.Lo,
+            "Width": self.Width,
+            "Min": self.Min if not self.empty else 0.0,
+            "Max": self.Max if not self.empty else 0.0,
+            "Count": self.Count,
+            "Sum": self.Sum,
+            "First": First,
+            "Counts": self.Counts[First:Last].tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, Dict):
+        Stats = cls(Bins=Dict["Bins"])
+        Stats.Lo, Stats.Width = Dict["Lo"], Dict["Width"]
+        Stats.Min, Stats.Max = Dict["Min"], Dict["Max"]
+        Stats.Count, Stats.Sum = Dict["Count"], Dict["Sum"]
+        First = Dict["First"]
+        Stats.Counts[First:First + len(Dict["Counts"])] = Dict["Counts"]
+        return Stats
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, Text):
+        return cls.from_dict(json.loads(Text)) if Text else cls()
+
+
+class MaxProjections:
+    """Max intensity projections of a (z, y, x) volume, accumulated chunk by chunk"""
+
+    def __init__(self, Depth):
+        self.Z = None
+        self.YX = None
+        self.Depth = Depth
+
+    def update(self, start, Chunk):
+        """Add the (z, y, x) Chunk starting at slice start"""
+        if self.Z is None:
+            self.Z = np.zeros(self.Depth, dtype=Chunk.dtype)
+        self.Z[start:start + Chunk.shape[0]] = Chunk.max(axis=(1, 2))
+        YX = Chunk.max(axis=0)
+        if self.YX is None:
+            self.YX = YX
+        else:
+            np.maximum(self.YX, YX, out=self.YX)
+
+    def bounding_box(self, Threshold, Margin=0):
+        """[(start, stop)] index ranges along z, y and x holding every voxel
+        above Threshold, widened by Margin voxels. None if no voxel is above"""
+        if self.Z is None:
+            return None
+        Box = []
+        for Profile in (self.Z, self.YX.max(axis=1), self.YX.max(axis=0)):
+            Above = np.flatnonzero(Profile > Threshold)
+            if not Above.size:
+                return None
+            Box.append((max(0, int(Above[0]) - Margin),
+                        min(len(Profile), int(Above[-1]) + 1 + Margin)))
+        return Box
+
+
+def max_projections(Array, ChunkSize=64):
+    """Max projections of a whole (z, y, x) array, chunk by chunk"""
+    Projections = MaxProjections(Array.shape[0])
+    for start in range(0, Array.shape[0], ChunkSize):
+        Projections.update(start, Array[start:start + ChunkSize])
+    return Projections
+
+
+def slice_footprints(Array, Floor, ChunkSize=64):
+    """[x0, y0, x1, y1] rectangle of the voxels above Floor in every slice of a
+    (z, y, x) array, None for the slices without any"""
+    Footprints = []
+    for start in range(0, Array.shape[0], ChunkSize):
+        Mask = Array[start:start + ChunkSize] > Floor
+        for Rows, Cols in zip(Mask.any(axis=2), Mask.any(axis=1)):
+            y, x = np.flatnonzero(Rows), np.flatnonzero(Cols)
+            if not y.size:
+                Footprints.append(None)
+                continue
+            Footprints.append([int(x[0]), int(y[0]), int(x[-1]) + 1, int(y[-1]) + 1])
+    return Footprints
+
+
+def volume_stats(Array):
+    """Statistics of a whole (z, y, x) array"""
+    Stats = VolumeStats()
+    Stats.update(Array)
+    return Stats
+
+
+def occupied_bricks(Array, BrickSize, Floor):
+    """[x0, y0, z0, x1, y1, z1] voxel boxes of the BrickSize bricks of a (z, y, x)
+    array holding voxels above Floor, the empty bricks are left out"""
+    Bricks = []
+    Depth, Height, Width = Array.shape
+    for z0 in range(0, Depth, BrickSize):
+        Slab = Array[z0:z0 + BrickSize]
+        for y0 in range(0, Height, BrickSize):
+            for x0 in range(0, Width, BrickSize):
+                Block = Slab[:, y0:y0 + BrickSize, x0:x0 + BrickSize]
+                if Block.max() > Floor:
+                    Bricks.append([x0, y0, z0, x0 + Block.shape[2], y0 + Block.shape[1],
+                                   z0 + Block.shape[0]])
+    return Bricks
@@ -2,12 +2,15 @@
 import os
 import sys
 import shutil
+import json
+import threading
 from os.path import join, exists, abspath
 
 from math import pi
 import numpy as np
 from time import sleep, perf_counter as Tcounter
 from importlib import reload
+from queue import Queue, Empty
 from bpy.app.handlers import persistent
 
 # Blender Imports :
@@ -29,6 +32,9 @@ from vtkmodules.vtkFiltersGeneral import vtkTransformPolyDataFilter
 from vtkmodules.vtkFiltersModeling import vtkFillHolesFilter
 from vtkmodules.util import numpy_support
 
+from . import INTACT_Vdb as vdb
+from . import INTACT_VolumeCache as volume_cache
+
 
 # Global Variables :
 
@@ -97,6 +103,10 @@ def CleanScanData(Prefix):
     # Remove Voxel data :
     [Meshes.remove(m) for m in Meshes if f"{Prefix}_PLANE_" in m.name]
     [Images.remove(img) for img in Images if f"{Prefix}_img" in img.name]
+    [Images.remove(img) for img in Images if f"{Prefix}_atlas" in img.name]
+    [Images.remove(img) for img in Images if f"{Prefix}_lod" in img.name]
+    [Images.remove(img) for img in Images if f"{Prefix}_axis" in img.name]
+    [Images.remove(img) for img in Images if f"{Prefix}_brick" in img.name]
     [Materials.remove(mat) for mat in Materials if "IT001_Voxelmat_" in mat.name]
     [NodeGroups.remove(NG) for NG in NodeGroups if "IT001_VGS_" in NG.name]
 
@@ -161,6 +171,60 @@ def RelPath(P):
     return P
 
 
+#######################################################################################
+# Project saves :
+# Loading stages only mark the project dirty, the .blend is then written once, at the
+# end of the pipeline or from a timer once the running operator has returned, instead
+# of after every stage.
+#######################################################################################
+
+
+class ProjectState:
+    Dirty = False
+
+
+def MarkProjectDirty():
+    ProjectState.Dirty = True
+
+
+def MarkProjectClean():
+    """Forget the pending save, the stages that marked the project were undone"""
+    ProjectState.Dirty = False
+    if bpy.app.timers.is_registered(SaveProjectTimer):
+        bpy.app.timers.unregister(SaveProjectTimer)
+
+
+def SaveProject():
+    """Save the .blend if a stage marked it dirty, returns True if it was saved"""
+    if not ProjectState.Dirty or not bpy.data.filepath:
+        return False
+    ProjectState.Dirty = False
+    try:
+        bpy.ops.wm.save_mainfile()
+    except RuntimeError as Error:
+        ProjectState.Dirty = True
+        print(f"Project not saved : {Error}")
+        return False
+    return True
+
+
+def SaveProjectTimer():
+    SaveProject()
+    return None
+
+
+def SaveProjectLater(Delay=0.5):
+    """Save the dirty project from a timer, so the UI is updated first"""
+    if not bpy.app.timers.is_registered(SaveProjectTimer):
+        bpy.app.timers.register(SaveProjectTimer, first_interval=Delay)
+
+
+@persistent
+def ProjectLoadPost(*args):
+    """The dirty flag belongs to the file it was set in"""
+    MarkProjectClean()
+
+
 ############################
 # Make directory function :
 ############################
@@ -180,6 +244,59 @@ def CopyDcmSerieToProjDir(DcmSerie, DicomSeqDir):
         shutil.copy2(DcmSerie[i], DicomSeqDir)
 
 
+################################
+# Bounded worker pool function :
+################################
+def RunWorkerPool(Worker, Tasks, Consumer, Workers=None):
+    """Run Worker(Task) on a fixed number of threads and hand every result to
+    Consumer(Task, Result) on the calling thread.
+
+    Only Worker runs in parallel, so it must not touch bpy data : datablocks
+    are created by Consumer, on the thread that called RunWorkerPool. Results
+    are passed through a bounded queue, so at most a few results wait for the
+    Consumer at any time.
+    """
+    Tasks = list(Tasks)
+    Workers = max(1, min(Workers or os.cpu_count() or 4, len(Tasks)))
+    TaskQueue = Queue()
+    for Task in Tasks:
+        TaskQueue.put(Task)
+    ResultQueue = Queue(maxsize=2 * Workers)
+    Stop = threading.Event()
+
+    def WorkerLoop():
+        while not Stop.is_set():
+            try:
+                Task = TaskQueue.get_nowait()
+            except Empty:
+                return
+            try:
+                ResultQueue.put((Task, Worker(Task), None))
+            except Exception as Error:
+                ResultQueue.put((Task, None, Error))
+
+    threads = [threading.Thread(target=WorkerLoop, daemon=True) for _ in range(Workers)]
+    for t in threads:
+        t.start()
+
+    try:
+        for _ in range(len(Tasks)):
+            Task, Result, Error = ResultQueue.get()
+            if Error:
+                raise Error
+            Consumer(Task, Result)
+    finally:
+        # Unblock the workers waiting on a full queue before joining them :
+        Stop.set()
+        while any(t.is_alive() for t in threads):
+            try:
+                ResultQueue.get(timeout=0.05)
+            except Empty:
+                pass
+        for t in threads:
+            t.join()
+
+
 ##########################################################################################
 ######################### INTACT Volume Render : ########################################
 ##########################################################################################
@@ -475,106 +592,463 @@ def MoveToCollection(obj, CollName):
                 Coll.objects.unlink(obj)
 
 
-def VolumeRender(ImageInfo, GpShader, ShadersBlendFile):
+# Largest texture size supported by the GPUs INTACT targets, fewer pages keep
+# the texture count of the atlas material low :
+ATLAS_PAGE_SIZE = 8192
 
-    Prefix = ImageInfo.Prefix
 
-    Sp = Spacing = ImageInfo.RenderSp
-    Sz = Size = ImageInfo.RenderSz
+def AtlasLayout(Count, Height, Width, PageSize=ATLAS_PAGE_SIZE):
+    """(Cols, Rows, Pages) of an atlas of Count Height * Width slices.
 
-    TransformMatrix = ImageInfo.TransformMatrix
-    DimX, DimY, DimZ = (Sz[0] * Sp[0], Sz[1] * Sp[1], Sz[2] * Sp[2])
-    Offset = Sp[2]
+    Every slice tile has a 1 pixel border so linear filtering does not bleed
+    into the neighbouring slices. All pages have the same size.
+    """
+    TileW, TileH = Width + 2, Height + 2
+    Cols = max(1, min(Count, PageSize // TileW))
+    Rows = max(1, min(-(-Count // Cols), PageSize // TileH))
+    Pages = -(-Count // (Cols * Rows))
+    return Cols, Rows, Pages
+
+
+def AtlasUVRects(Count, Height, Width, Layout):
+    """(Count, 4) [u0, v0, u1, v1] UV rectangles of the slices in the atlas :
+    u = page + u in the page"""
+    Cols, Rows, Pages = Layout
+    TileW, TileH = Width + 2, Height + 2
+    PageW, PageH = Cols * TileW, Rows * TileH
+    Index = np.arange(Count)
+    Page, Tile = np.divmod(Index, Cols * Rows)
+    U0 = Page + ((Tile % Cols) * TileW + 1) / PageW
+    V0 = ((Tile // Cols) * TileH + 1) / PageH
+    U1 = U0 + Width / PageW
+    V1 = V0 + Height / PageH
+    return np.stack([U0, V0, U1, V1], axis=1)
+
+
+def AtlasMaterial(Name, Pages, VGS):
+    """Single material reading the slices from the atlas Pages.
+
+    The page of a quad is floor(u), the texture coordinates in the page are
+    (fract(u), v). The node count grows with the pages, not the slices.
+    """
+    mat = bpy.data.materials.new(Name)
+    mat.use_nodes = True
+    node_tree = mat.node_tree
+    nodes = node_tree.nodes
+    links = node_tree.links
 
-    ImagesNamesList = sorted(
-        [img.name for img in bpy.data.images if img.name.startswith(Prefix)]
-    )
-    ImagesList = [bpy.data.images[Name] for Name in ImagesNamesList]
+    for node in nodes:
+        if node.type != "OUTPUT_MATERIAL":
+            nodes.remove(node)
 
-    Start = Tcounter()
+    TextureCoord = AddNode(nodes, type="ShaderNodeTexCoord", name="TextureCoord")
+    SeparateUV = AddNode(nodes, type="ShaderNodeSeparateXYZ", name="SeparateUV")
+    PageIndex = AddNode(nodes, type="ShaderNodeMath", name="PageIndex")
+    PageIndex.operation = "FLOOR"
+    PageU = AddNode(nodes, type="ShaderNodeMath", name="PageU")
+    PageU.operation = "FRACT"
+    PageUV = AddNode(nodes, type="ShaderNodeCombineXYZ", name="PageUV")
+
+    links.new(TextureCoord.outputs["UV"], SeparateUV.inputs[0])
+    links.new(SeparateUV.outputs[0], PageIndex.inputs[0])
+    links.new(SeparateUV.outputs[0], PageU.inputs[0])
+    links.new(PageU.outputs[0], PageUV.inputs[0])
+    links.new(SeparateUV.outputs[1], PageUV.inputs[1])
+
+    Color = None
+    for p, ImageData in enumerate(Pages):
+        ImageTexture = AddNode(nodes, type="ShaderNodeTexImage", name=f"Atlas_{p}")
+        ImageTexture.image = ImageData
+        ImageTexture.extension = "EXTEND"
+        ImageData.colorspace_settings.name = "Non-Color"
+        links.new(PageUV.outputs[0], ImageTexture.inputs[0])
+        if Color is None:
+            Color = ImageTexture.outputs["Color"]
+            continue
+
+        IsPage = AddNode(nodes, type="ShaderNodeMath", name=f"IsPage_{p}")
+        IsPage.operation = "COMPARE"
+        IsPage.inputs[1].default_value = p
+        IsPage.inputs[2].default_value = 0.5
+        links.new(PageIndex.outputs[0], IsPage.inputs[0])
+
+        Mix = AddNode(nodes, type="ShaderNodeMixRGB", name=f"Page_{p}")
+        links.new(IsPage.outputs[0], Mix.inputs["Fac"])
+        links.new(Color, Mix.inputs["Color1"])
+        links.new(ImageTexture.outputs["Color"], Mix.inputs["Color2"])
+        Color = Mix.outputs["Color"]
+
+    GroupNode = nodes.new("ShaderNodeGroup")
+    GroupNode.node_tree = VGS
+    links.new(Color, GroupNode.inputs[0])
+    links.new(GroupNode.outputs[0], nodes["Material Output"].inputs["Surface"])
+
+    if bpy.app.version <= (4, 2, 0):
+        mat.blend_method = "HASHED"
+        mat.shadow_method = "HASHED"
+
+    return mat
+
+
+def PlaneStackQuads(Size, Spacing, UVRects=None, Footprints=None):
+    """Quads of a stack of Size[2] slices of Size[0] * Size[1] voxels, centered
+    on the origin. Returns the (N, 4, 3) corners, (N, 8) UVs and slice indices.
+
+    UVRects are the [u0, v0, u1, v1] texture rectangles of the slices (0-1 by
+    default). Footprints are the [x0, y0, x1, y1] voxel rectangles of the
+    slices, quads are trimmed to them and slices with a None footprint are
+    left out.
+    """
+    Width, Height, Count = Size
+    Full = np.array([0, 0, Width, Height], dtype=np.float64)
+    if Footprints:
+        Slices = np.array([i for i, F in enumerate(Footprints) if F], dtype=np.intp)
+        Rects = np.array([Footprints[i] for i in Slices], dtype=np.float64).reshape(-1, 4)
+    else:
+        Slices = np.arange(Count)
+        Rects = np.tile(Full, (Count, 1))
+    if UVRects is None:
+        UVRects = np.tile([0.0, 0.0, 1.0, 1.0], (Count, 1))
+    UVRects = np.asarray(UVRects)[Slices]
+
+    # Voxel rectangle -> position, and -> texture coordinates :
+    Scale = np.array([Spacing[0], Spacing[1]] * 2)
+    XY = (Rects - Full[[2, 3, 2, 3]] / 2) * Scale
+    Ratio = Rects / Full[[2, 3, 2, 3]]
+    UVSize = (UVRects[:, 2:] - UVRects[:, :2])
+    UV = np.concatenate([UVRects[:, :2] + Ratio[:, :2] * UVSize,
+                         UVRects[:, :2] + Ratio[:, 2:] * UVSize], axis=1)
+
+    Corners = [(0, 1), (2, 1), (2, 3), (0, 3)]
+    Verts = np.empty((len(Slices), 4, 3), dtype=np.float32)
+    UVs = np.empty((len(Slices), 4, 2), dtype=np.float32)
+    for k, (cx, cy) in enumerate(Corners):
+        Verts[:, k, 0], Verts[:, k, 1] = XY[:, cx], XY[:, cy]
+        UVs[:, k, 0], UVs[:, k, 1] = UV[:, cx], UV[:, cy]
+    Verts[:, :, 2] = ((Slices - (Count - 1) / 2) * Spacing[2])[:, np.newaxis]
+
+    return Verts, UVs.reshape(-1, 8), Slices
+
+
+def AddQuadsMesh(Name, Verts, UVs, MaterialIndex=None):
+    """Mesh of the (N, 4, 3) quads Verts with their (N, 8) UVs, quad i uses
+    material MaterialIndex[i] (0 by default).
+
+    The geometry is written with foreach_set, no object or operator is needed.
+    """
+    Count = len(Verts)
+    mesh_data = bpy.data.meshes.new(f"{Name}_mesh")
+    mesh_data.vertices.add(Count * 4)
+    mesh_data.vertices.foreach_set("co", np.ascontiguousarray(Verts, dtype=np.float32).ravel())
+    mesh_data.loops.add(Count * 4)
+    mesh_data.loops.foreach_set("vertex_index", np.arange(Count * 4, dtype=np.int32))
+    mesh_data.polygons.add(Count)
+    mesh_data.polygons.foreach_set("loop_start", np.arange(0, Count * 4, 4, dtype=np.int32))
+    if bpy.app.version < (3, 6, 0):
+        mesh_data.polygons.foreach_set("loop_total", np.full(Count, 4, dtype=np.int32))
+    if MaterialIndex is not None:
+        mesh_data.polygons.foreach_set("material_index",
+                                       np.asarray(MaterialIndex, dtype=np.int32))
 
-    # Set Render settings:
-    Scene_Settings()
+    uvs = mesh_data.uv_layers.new(name=f"{Name}_uv")
+    uvs.data.foreach_set("uv", np.ascontiguousarray(UVs, dtype=np.float32).ravel())
+
+    mesh_data.update(calc_edges=True)
+    return mesh_data
+
+
+def SliceMaterial(Name, ImageData, VGS):
+    """Material of one slice of a SLICES mode stack"""
+    mat = bpy.data.materials.new(Name)
+    mat.use_nodes = True
+    node_tree = mat.node_tree
+    nodes = node_tree.nodes
+    links = node_tree.links
+
+    for node in nodes:
+        if node.type != "OUTPUT_MATERIAL":
+            nodes.remove(node)
+
+    TextureCoord = AddNode(nodes, type="ShaderNodeTexCoord", name="TextureCoord")
+    ImageTexture = AddNode(nodes, type="ShaderNodeTexImage", name="Image Texture")
+
+    ImageTexture.image = ImageData
+    ImageData.colorspace_settings.name = "Non-Color"
+
+    materialOutput = nodes["Material Output"]
+
+    links.new(TextureCoord.outputs["UV"], ImageTexture.inputs[0])
 
-    # Add Planes with textured material :
-    PlanesList = []
+    GroupNode = nodes.new("ShaderNodeGroup")
+    GroupNode.node_tree = VGS
 
+    links.new(ImageTexture.outputs["Color"], GroupNode.inputs[0])
+    links.new(GroupNode.outputs[0], materialOutput.inputs["Surface"])
+
+    if bpy.app.version <= (4, 2, 0):
+        mat.blend_method = "HASHED"
+        mat.shadow_method = "HASHED"
+
+    return mat
+
+
+# Plane stacks of a render volume, by the axis they are stacked along : the
+# volume axes (0 = x, 1 = y, 2 = z) of the quad columns, rows and slices.
+STACK_AXES = {
+    "Z": (0, 1, 2),
+    "Y": (0, 2, 1),
+    "X": (1, 2, 0),
+}
+
+
+def StackArray(Array, Axis):
+    """(slice, row, column) view of a (z, y, x) volume for the Axis stack"""
+    Cols, Rows, Slices = STACK_AXES[Axis]
+    return Array.transpose(2 - Slices, 2 - Rows, 2 - Cols)
+
+
+def StackImagesPrefix(Prefix, Axis):
+    return Prefix if Axis == "Z" else f"{Prefix}_axis{Axis}"
+
+
+def StackMeshName(Prefix, Axis):
+    return f"{Prefix}_PLANE_STACK" if Axis == "Z" else f"{Prefix}_PLANE_STACK_{Axis}"
+
+
+def StackMeshes(Prefix):
+    """{Axis: mesh} of the plane stacks built for the volume Prefix"""
+    Meshes = {}
+    for Axis in STACK_AXES:
+        mesh = bpy.data.meshes.get(f"{StackMeshName(Prefix, Axis)}_mesh")
+        if mesh:
+            Meshes[Axis] = mesh
+    return Meshes
+
+
+def StackMesh(Name, ImagesPrefix, Size, Spacing, RenderMode, VGS, Footprints=None, Axis="Z"):
+    """Plane stack mesh of a Size render volume with its materials, textured with
+    the {ImagesPrefix}_img* slice images or the {ImagesPrefix}_atlas* pages.
+    The planes are stacked along Axis, Footprints are those of that stack."""
+    # Quads are built along z, then their coordinates are mapped to the volume axes :
+    Axes = STACK_AXES[Axis]
+    Size = tuple(Size[a] for a in Axes)
+    Spacing = tuple(Spacing[a] for a in Axes)
+    ToVolume = np.argsort(Axes)
+
+    if RenderMode == "ATLAS":
+        # One material for the whole stack, slices read from the atlas pages :
+        Pages = sorted(
+            [img for img in bpy.data.images if img.name.startswith(f"{ImagesPrefix}_atlas")],
+            key=lambda img: img.name,
+        )
+        Count, Height, Width = Size[2], Size[1], Size[0]
+        UVRects = AtlasUVRects(Count, Height, Width, AtlasLayout(Count, Height, Width))
+        Verts, UVs, Slices = PlaneStackQuads(Size, Spacing, UVRects, Footprints)
+        mesh = AddQuadsMesh(Name, Verts[:, :, ToVolume], UVs)
+        mesh.materials.append(AtlasMaterial(f"{ImagesPrefix}_Voxelmat_atlas", Pages, VGS))
+        return mesh
+
+    ImagesList = sorted(
+        [img for img in bpy.data.images if img.name.startswith(f"{ImagesPrefix}_img")],
+        key=lambda img: img.name,
+    )
+    # One mesh holding every slice quad, the quad of slice i uses material i :
+    Verts, UVs, Slices = PlaneStackQuads((Size[0], Size[1], len(ImagesList)), Spacing,
+                                         Footprints=Footprints)
+    mesh = AddQuadsMesh(Name, Verts[:, :, ToVolume], UVs, MaterialIndex=Slices)
     for i, ImageData in enumerate(ImagesList):
-        # Add Plane :
-        Name = f"{Prefix}_PLANE_{i}"
-        mesh = AddPlaneMesh(DimX, DimY, Name)
-        CollName = "CT_Voxel"
+        mesh.materials.append(SliceMaterial(f"{ImagesPrefix}_Voxelmat_{i}", ImageData, VGS))
+    return mesh
+
+
+def VdbMaterial(Name):
+    """Volume material of an OpenVDB CT volume : the density grid above the
+    Low_Treshold value (0-255), rescaled to 0-1"""
+    mat = bpy.data.materials.new(Name)
+    mat.use_nodes = True
+    node_tree = mat.node_tree
+    nodes = node_tree.nodes
+    links = node_tree.links
 
-        obj = AddPlaneObject(Name, mesh, CollName)
-        obj.location[2] = i * Offset
-        PlanesList.append(obj)
+    for node in nodes:
+        if node.type != "OUTPUT_MATERIAL":
+            nodes.remove(node)
 
-        bpy.ops.object.select_all(action="DESELECT")
-        obj.select_set(True)
-        bpy.context.view_layer.objects.active = obj
+    Density = AddNode(nodes, type="ShaderNodeAttribute", name="Density")
+    Density.attribute_name = vdb.GRID_NAME
+    Threshold = AddNode(nodes, type="ShaderNodeValue", name="Low_Treshold")
+    ThresholdRatio = AddNode(nodes, type="ShaderNodeMath", name="ThresholdRatio")
+    ThresholdRatio.operation = "DIVIDE"
+    ThresholdRatio.inputs[1].default_value = 255.0
+    DensityRange = AddNode(nodes, type="ShaderNodeMapRange", name="DensityRange")
+    Volume = AddNode(nodes, type="ShaderNodeVolumePrincipled", name="PrincipledVolume")
+
+    links.new(Threshold.outputs[0], ThresholdRatio.inputs[0])
+    links.new(ThresholdRatio.outputs[0], DensityRange.inputs["From Min"])
+    links.new(Density.outputs["Fac"], DensityRange.inputs["Value"])
+    links.new(DensityRange.outputs["Result"], Volume.inputs["Density"])
+    links.new(Volume.outputs["Volume"], nodes["Material Output"].inputs["Volume"])
+
+    return mat
+
+
+def VdbCrop(mat, Cube):
+    """Crop an OpenVDB volume material with Cube : no density inside the cube, like
+    the DIFFERENCE boolean of the mesh volumes, which Volume objects do not take.
+    The cropping cube is a unit cube (see CroppingCubeCreation), its object
+    coordinates are inside it up to 0.5 along every axis."""
+    nodes = mat.node_tree.nodes
+    links = mat.node_tree.links
+    if "CropCoord" in nodes:
+        nodes["CropCoord"].object = Cube
+        return
+
+    CropCoord = AddNode(nodes, type="ShaderNodeTexCoord", name="CropCoord")
+    CropCoord.object = Cube
+    CropAxes = AddNode(nodes, type="ShaderNodeSeparateXYZ", name="CropAxes")
+    links.new(CropCoord.outputs["Object"], CropAxes.inputs[0])
+
+    # Largest absolute object coordinate, above 0.5 outside of the cube :
+    Distance = None
+    for i, Axis in enumerate("XYZ"):
+        Abs = AddNode(nodes, type="ShaderNodeMath", name=f"CropAbs{Axis}")
+        Abs.operation = "ABSOLUTE"
+        links.new(CropAxes.outputs[i], Abs.inputs[0])
+        if Distance is None:
+            Distance = Abs.outputs[0]
+            continue
+        Max = AddNode(nodes, type="ShaderNodeMath", name=f"CropMax{Axis}")
+        Max.operation = "MAXIMUM"
+        links.new(Distance, Max.inputs[0])
+        links.new(Abs.outputs[0], Max.inputs[1])
+        Distance = Max.outputs[0]
+
+    Outside = AddNode(nodes, type="ShaderNodeMath", name="CropOutside")
+    Outside.operation = "GREATER_THAN"
+    Outside.inputs[1].default_value = 0.5
+    links.new(Distance, Outside.inputs[0])
+    Cropped = AddNode(nodes, type="ShaderNodeMath", name="CropDensity")
+    Cropped.operation = "MULTIPLY"
+    links.new(nodes["DensityRange"].outputs["Result"], Cropped.inputs[0])
+    links.new(Outside.outputs[0], Cropped.inputs[1])
+    links.new(Cropped.outputs[0], nodes["PrincipledVolume"].inputs["Density"])
+
+
+def BoundsMesh(Name, Size, Spacing):
+    """Mesh of the 8 corners of a Size volume, without faces : gives the volume
+    object of a bricked render its dimensions, draws nothing"""
+    Half = np.array([Size[i] * Spacing[i] / 2 for i in range(3)])
+    Corners = np.array([(x, y, z) for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)]) * Half
+    mesh_data = bpy.data.meshes.new(f"{Name}_mesh")
+    mesh_data.vertices.add(8)
+    mesh_data.vertices.foreach_set("co", Corners.astype(np.float32).ravel())
+    mesh_data.update()
+    return mesh_data
 
-        # Add Material:
-        mat = bpy.data.materials.new(f"{Prefix}_Voxelmat_{i}")
-        mat.use_nodes = True
-        node_tree = mat.node_tree
-        nodes = node_tree.nodes
-        links = node_tree.links
 
-        for node in nodes:
-            if node.type != "OUTPUT_MATERIAL":
-                nodes.remove(node)
+def VolumeBricks(Volume):
+    """Brick objects of a bricked CT volume"""
+    return [obj for obj in Volume.children if "_CTVolume_Brick" in obj.name]
 
-        TextureCoord = AddNode(nodes, type="ShaderNodeTexCoord", name="TextureCoord")
-        ImageTexture = AddNode(nodes, type="ShaderNodeTexImage", name="Image Texture")
 
-        ImageTexture.image = ImageData
-        ImageData.colorspace_settings.name = "Non-Color"
+def VolumeLods(Volume):
+    """LOD stack objects of a CT volume"""
+    return [obj for obj in Volume.children if "_CTVolume_LOD" in obj.name]
 
-        materialOutput = nodes["Material Output"]
 
-        links.new(TextureCoord.outputs[0], ImageTexture.inputs[0])
+def LodSize(Size, Spacing, Level):
+    """Size and spacing of the LOD Level of a render volume : a block mean by
+    2 ** Level along every axis, keeping the extent of the volume"""
+    Factor = 2 ** Level
+    LodSz = tuple(-(-Size[i] // Factor) for i in range(3))
+    LodSp = tuple(Size[i] * Spacing[i] / LodSz[i] for i in range(3))
+    return LodSz, LodSp
 
-        # Load VGS Group Node :
-        VGS = bpy.data.node_groups.get(GpShader)
-        if not VGS:
-            filepath = join(ShadersBlendFile, "NodeTree", GpShader)
-            directory = join(ShadersBlendFile, "NodeTree")
-            filename = GpShader
-            bpy.ops.wm.append(filepath=filepath, filename=filename, directory=directory)
-            VGS = bpy.data.node_groups.get(GpShader)
 
-        GroupNode = nodes.new("ShaderNodeGroup")
-        GroupNode.node_tree = VGS
+def VolumeRender(ImageInfo, GpShader, ShadersBlendFile):
 
-        links.new(ImageTexture.outputs["Color"], GroupNode.inputs[0])
-        links.new(GroupNode.outputs[0], materialOutput.inputs["Surface"])
-        for slot in obj.material_slots:
-            bpy.ops.object.material_slot_remove()
+    Prefix = ImageInfo.Prefix
 
-        obj.active_material = mat
+    Sp = Spacing = ImageInfo.RenderSp
+    Sz = Size = ImageInfo.RenderSz
 
-        if bpy.app.version <= (4, 2, 0):
-            mat.blend_method = "HASHED"
-            mat.shadow_method = "HASHED"
+    TransformMatrix = ImageInfo.TransformMatrix
+    # Slices trimmed to their non empty rectangle, if computed at load time :
+    Footprints = json.loads(ImageInfo.Footprints) if ImageInfo.Footprints else {}
 
-        # END LOOP ##################################
+    Start = Tcounter()
 
-    # Join Planes Make Cube Voxel :
-    bpy.ops.object.select_all(action="DESELECT")
-    for obj in PlanesList:
-        obj.select_set(True)
-        bpy.context.view_layer.objects.active = obj
-    bpy.context.view_layer.layer_collection.children["CT_Voxel"].hide_viewport = False
-    bpy.ops.object.join()
+    # Set Render settings:
+    Scene_Settings()
 
-    Voxel = bpy.context.object
+    # Load VGS Group Node :
+    VGS = bpy.data.node_groups.get(GpShader)
+    if not VGS:
+        filepath = join(ShadersBlendFile, "NodeTree", GpShader)
+        directory = join(ShadersBlendFile, "NodeTree")
+        filename = GpShader
+        bpy.ops.wm.append(filepath=filepath, filename=filename, directory=directory)
+        VGS = bpy.data.node_groups.get(GpShader)
 
-    Voxel.name = f"{Prefix}_CTVolume"
-    bpy.ops.object.transform_apply(location=False, rotation=False, scale=True)
-    bpy.ops.object.origin_set(type="ORIGIN_GEOMETRY", center="MEDIAN")
+    Bricks = json.loads(ImageInfo.Bricks) if ImageInfo.Bricks else None
+
+    if ImageInfo.RenderMode == "VDB":
+        # Native volume object reading the density grid written at load time :
+        VolumeMesh = bpy.data.volumes.new(f"{Prefix}_VOLUME")
+        VolumeMesh.filepath = ImageInfo.VdbPath
+        VolumeMesh.materials.append(VdbMaterial(f"{Prefix}_Voxelmat_vdb"))
+    elif Bricks is not None:
+        # Bricked volume : the volume object only holds the bounds, the occupied
+        # bricks are its children (see below) :
+        VolumeMesh = BoundsMesh(f"{Prefix}_PLANE_BOUNDS", Sz, Sp)
+    else:
+        # The volume object shows one stack at a time, the others are kept as fake
+        # user meshes and swapped in when the view turns (see INTACT_VolumeView) :
+        Axes = STACK_AXES if ImageInfo.ViewStacks else ("Z",)
+        for Axis in Axes:
+            StackFootprints = Footprints.get(Axis)
+            if StackFootprints and not any(StackFootprints):
+                StackFootprints = None
+            mesh = StackMesh(StackMeshName(Prefix, Axis), StackImagesPrefix(Prefix, Axis), Sz,
+                             Sp, ImageInfo.RenderMode, VGS, StackFootprints, Axis)
+            mesh.use_fake_user = ImageInfo.ViewStacks
+            if Axis == "Z":
+                VolumeMesh = mesh
+
+    Voxel = AddPlaneObject(f"{Prefix}_CTVolume", VolumeMesh, "CT_Voxel")
+    bpy.context.view_layer.layer_collection.children["CT_Voxel"].hide_viewport = False
+
+    bpy.ops.object.select_all(action="DESELECT")
+    Voxel.select_set(True)
+    bpy.context.view_layer.objects.active = Voxel
 
     Voxel.matrix_world = TransformMatrix
 
+    if Bricks is not None:
+        Voxel.display_type = "BOUNDS"
+    # Every brick is a plane stack centered on its box, hidden when culled
+    # (see INTACT_VolumeView) :
+    for b, Box in enumerate(Bricks or []):
+        BrickSz = tuple(Box[i + 3] - Box[i] for i in range(3))
+        mesh = StackMesh(f"{Prefix}_PLANE_BRICK{b:04}", f"{Prefix}_brick{b:04}", BrickSz, Sp,
+                         ImageInfo.RenderMode, VGS)
+        Brick = AddPlaneObject(f"{Prefix}_CTVolume_Brick{b:04}", mesh, "CT_Voxel")
+        Brick.parent = Voxel
+        Brick.location = [((Box[i] + Box[i + 3]) / 2 - Sz[i] / 2) * Sp[i] for i in range(3)]
+        Brick.hide_select = True
+
+    # Coarser stacks shown while the viewport is navigated (see INTACT_VolumeView),
+    # children of the volume so they follow its transform :
+    for Level in range(1, ImageInfo.LodLevels + 1):
+        LodSz, LodSp = LodSize(Sz, Sp, Level)
+        mesh = StackMesh(f"{Prefix}_PLANE_STACK_LOD{Level}", f"{Prefix}_lod{Level}",
+                         LodSz, LodSp, ImageInfo.RenderMode, VGS)
+        Lod = AddPlaneObject(f"{Prefix}_CTVolume_LOD{Level}", mesh, "CT_Voxel")
+        Lod.parent = Voxel
+        Lod.hide_select = True
+        Lod.hide_render = True
+        Lod.hide_viewport = True
+
     context_override = CtxOverride(bpy.context)
     execute_in_context(context_override, bpy.ops.view3d.view_selected, use_all_regions=False)
 
@@ -623,143 +1097,457 @@ def Scene_Settings():
             break
 
 
-def SlicesUpdate(scene, slice_index):
-    """ Update slices when moved in UI. Slice index determines which slice to update 0 = axial, 1 = Coronal,
-    2 = Sagital
+SLICE_SUFFIXES = ["_AXIAL_SLICE", "_CORONAL_SLICE", "_SAGITAL_SLICE"]
+
+
+def AxisAlignedSlice(Array, Matrix, Translation, Origin, Spacing, Out_Origin, Out_Size,
+                     Out_Spacing, Tolerance=1e-4):
+    """Slice sampled like sitk.Resample (linear, 0 outside) from the (z, y, x) Array
+    of an image with identity direction, read directly from the array planes.
+
+    Matrix and Translation are those of the resampling transform. Only the axis
+    aligned case is served : the output rows and columns follow image axes voxel
+    by voxel and only the position along the slice normal falls between two
+    planes, which are then linearly interpolated. Returns None otherwise.
+    """
+    R = np.array(Matrix, dtype=np.float64).reshape(3, 3)
+    Sp = np.array(Spacing, dtype=np.float64)
+    # Continuous image index of output pixel (u, v) : Start + u * Steps[0] + v * Steps[1]
+    Start = (R @ np.array(Out_Origin, dtype=np.float64) + np.array(Translation)
+             - np.array(Origin)) / Sp
+    Steps = np.stack([R[:, 0] * Out_Spacing[0], R[:, 1] * Out_Spacing[1]]) / Sp
+    Axes = np.abs(Steps).argmax(axis=1)
+    if Axes[0] == Axes[1]:
+        return None
+    Signs = np.sign(Steps[[0, 1], Axes])
+    Expected = np.zeros((2, 3))
+    Expected[[0, 1], Axes] = Signs
+    if not np.allclose(Steps, Expected, atol=Tolerance):
+        return None
+    InPlane = Start[Axes]
+    if not np.allclose(InPlane, np.round(InPlane), atol=Tolerance):
+        return None
+
+    Normal = 3 - Axes[0] - Axes[1]
+    Size = Array.shape[::-1]
+    Index = [np.round(InPlane[k]).astype(np.intp) + Signs[k].astype(np.intp) * np.arange(Out_Size[k])
+             for k in range(2)]
+    Inside = [(I >= 0) & (I < Size[Axes[k]]) for k, I in enumerate(Index)]
+    Slice = np.zeros((Out_Size[1], Out_Size[0]), dtype=np.float32)
+
+    # Linear interpolation between the two planes around the normal position, the
+    # neighbours are clamped at the image borders :
+    c = Start[Normal]
+    if c < -0.5 or c >= Size[Normal] - 0.5 or not (Inside[0].any() and Inside[1].any()):
+        return Slice
+    c0 = int(np.floor(c))
+    Weight = c - c0
+    Planes = [np.clip(c0, 0, Size[Normal] - 1), np.clip(c0 + 1, 0, Size[Normal] - 1)]
+
+    # Plane axes in array order : the larger image axis first
+    Rows, Cols = Index[1][Inside[1]], Index[0][Inside[0]]
+    Values = 0
+    for Plane, PlaneWeight in zip(Planes, (1.0 - Weight, Weight)):
+        if PlaneWeight == 0:
+            continue
+        Plane2D = np.take(Array, Plane, axis=2 - Normal)
+        if Axes[1] > Axes[0]:
+            Sampled = Plane2D[np.ix_(Rows, Cols)]
+        else:
+            Sampled = Plane2D[np.ix_(Cols, Rows)].T
+        Values = Values + PlaneWeight * Sampled.astype(np.float32)
+    Slice[np.ix_(Inside[1], Inside[0])] = Values
+    return Slice
+
+
+def WindowSlice(Slice, Wmin, Wmax):
+    """uint8 0-255 window of a slice, like sitk.IntensityWindowing"""
+    Scale = 255.0 / (Wmax - Wmin) if Wmax > Wmin else 0.0
+    return np.clip((Slice - Wmin) * Scale, 0, 255).astype(np.uint8)
+
+
+def SlicePixels(Slice):
+    """Flat RGBA float buffer of a uint8 slice, as expected by bpy image pixels.
+
+    bpy images store their rows bottom-up, which is the row order of the
+    sitk array, so unlike the PNG files the slice is not flipped.
+    """
+    Pixels = np.empty(Slice.shape + (4,), dtype=np.float32)
+    Pixels[..., :3] = Slice[..., np.newaxis]
+    Pixels[..., :3] /= 255.0
+    Pixels[..., 3] = 1.0
+    return Pixels.ravel()
+
+
+class SliceState:
+    # Plane matrix, relative to its CT volume, of the last resampling of every slice :
+    Matrices = {}
+    # Last uint8 array of every slice, written to disk only on export :
+    Arrays = {}
+    # Requests are numbered, Shown is the number of the array shown by every slice :
+    Sequence = 0
+    Shown = {}
+
+
+def SliceImage(Plane, Height, Width):
+    """Generated image of a slice plane, in memory only. It is made again when the
+    slice size changes, or when it is still the PNG file of an older project."""
+    ImageName = f"{Plane.name}.png"
+    BlenderImage = bpy.data.images.get(ImageName)
+    if BlenderImage and BlenderImage.source == "GENERATED" and tuple(BlenderImage.size) == (Width, Height):
+        return BlenderImage
+
+    if BlenderImage:
+        bpy.data.images.remove(BlenderImage)
+    BlenderImage = bpy.data.images.new(ImageName, width=Width, height=Height, alpha=False)
+    BlenderImage.colorspace_settings.name = "Non-Color"
+
+    mat = bpy.data.materials.get(f"{Plane.name}_mat")
+    if mat and mat.node_tree and "Image Texture" in mat.node_tree.nodes:
+        mat.node_tree.nodes["Image Texture"].image = BlenderImage
+    return BlenderImage
+
+
+def ExportSlices(scene):
+    """Write the current slices to the SlicesDir of their volume as PNG files,
+    returns the written paths"""
+    INTACT_Props = scene.INTACT_Props
+    # Slices still showing a coarse preview are resampled at full resolution first :
+    if SliceWorker.Refine:
+        SlicesUpdateAll(scene)
+    Paths = []
+    for Name, Array in SliceState.Arrays.items():
+        Plane = bpy.data.objects.get(Name)
+        ImageInfo = INTACT_Props.Images.get(Name[2:7])
+        if not Plane or not ImageInfo:
+            continue
+        SlicesDir = AbsPath(ImageInfo.SlicesDir)
+        os.makedirs(SlicesDir, exist_ok=True)
+        ImagePath = join(SlicesDir, f"{Name}.png")
+        cv2.imwrite(ImagePath, np.flipud(Array))
+        Paths.append(ImagePath)
+    return Paths
+
+
+def SliceRequest(slice_index, Force=True, Preview=False):
+    """ Resampling parameters of a slice, read from the scene on the main thread. Slice index determines which
+    slice 0 = axial, 1 = Coronal, 2 = Sagital. None when there is no such slice or, unless Force, when it did
+    not move relative to its CT volume since its last request. Preview requests are sampled coarser, a volume
+    too small for a pyramid level (see PreviewFactor) never gets preview requests.
     """
     INTACT_Props = bpy.context.scene.INTACT_Props
-    slice_name_suffixes = ["_AXIAL_SLICE", "_CORONAL_SLICE", "_SAGITAL_SLICE"]
+    slice_name_suffixes = SLICE_SUFFIXES
 
     Planes = [
         obj
         for obj in bpy.context.scene.objects
         if (obj.name[2:4] == "IT" and obj.name.endswith(slice_name_suffixes[slice_index]))
     ]
+    if not Planes:
+        return None
+
+    Prefix = Planes[0].name[2:7]
+    Plane = [obj for obj in Planes if Prefix in obj.name][0]
+    ImageInfo = INTACT_Props.Images[Prefix]
+    ImageData = AbsPath(ImageInfo.Nrrd255Path)
+    CTVolume = bpy.data.objects.get(f"{Prefix}_CTVolume")
+    if not exists(ImageData) or not CTVolume:
+        return None
+
+    # Get Plane Orientation and location :
+    PlanMatrix = CTVolume.matrix_world.inverted() @ Plane.matrix_world
+    MatrixKey = tuple(tuple(row) for row in PlanMatrix)
+    if not Force and SliceState.Matrices.get(Plane.name) == MatrixKey:
+        return None
+    SliceState.Matrices[Plane.name] = MatrixKey
+    SliceState.Sequence += 1
+
+    Rot = PlanMatrix.to_euler()
+    return {
+        "Plane": Plane.name,
+        "Index": slice_index,
+        "ImageData": ImageData,
+        "Rotation": (Rot.x, Rot.y, Rot.z),
+        "Translation": tuple(PlanMatrix.translation),
+        "Window": (INTACT_Props.Slice_min, INTACT_Props.Slice_max),
+        "Sequence": SliceState.Sequence,
+        "Preview": Preview and PreviewFactor(ImageInfo.Size) > 1,
+    }
 
-    if Planes:
-        Condition1 = True
-        Prefix = Planes[0].name[2:7]
-
-        if Condition1:
-
-            Plane = [obj for obj in Planes if Prefix in obj.name][0]
-            ImageInfo = INTACT_Props.Images[Prefix]
-            ImageData = AbsPath(ImageInfo.Nrrd255Path)
-
-            Condition = exists(ImageData)
-
-            if Condition:
-
-                CTVolume = bpy.data.objects.get(f"{Prefix}_CTVolume")
-                TransformMatrix = CTVolume.matrix_world
-
-                SlicesDir = AbsPath(ImageInfo.SlicesDir)
-
-                ImageName = f"{Plane.name}.png"
-                ImagePath = join(SlicesDir, ImageName)
-
-                # Get ImageData Info :
-                Image3D_255 = sitk.ReadImage(ImageData)
-                Sp = Spacing = Image3D_255.GetSpacing()
-                Sz = Size = Image3D_255.GetSize()
-                Ortho_Origin = (
-                        -0.5 * np.array(Sp) * (np.array(Sz) - np.array((1, 1, 1)))
-                )
-                Image3D_255.SetOrigin(Ortho_Origin)
-                Image3D_255.SetDirection(np.identity(3).flatten())
-
-                # Output Parameters :
-                if slice_index == 0:
-                    Out_Origin = [Ortho_Origin[0], Ortho_Origin[1], 0]
-                    Out_Size = (Sz[0], Sz[1], 1)
-                elif slice_index == 1:
-                    Out_Origin = [Ortho_Origin[0], Ortho_Origin[2], 0]
-                    Out_Size = (Sz[0], Sz[2], 1)
-                elif slice_index == 2:
-                    Out_Origin = [Ortho_Origin[1], Ortho_Origin[2], 0]
-                    Out_Size = (Sz[1], Sz[2], 1)
-
-                Out_Direction = Vector(np.identity(3).flatten())
-                Out_Spacing = Sp
-
-                # Get Plane Orientation and location :
-                PlanMatrix = TransformMatrix.inverted() @ Plane.matrix_world
-                Rot = PlanMatrix.to_euler()
-                Trans = PlanMatrix.translation
-                Rvec = (Rot.x, Rot.y, Rot.z)
-                Tvec = Trans
-
-                # Euler3DTransform :
-                Euler3D = sitk.Euler3DTransform()
-                Euler3D.SetCenter((0, 0, 0))
-                Euler3D.SetRotation(Rvec[0], Rvec[1], Rvec[2])
-                Euler3D.SetTranslation(Tvec)
-                Euler3D.ComputeZYXOn()
-
-                Image2D = sitk.Resample(
-                    Image3D_255,
-                    Out_Size,
-                    Euler3D,
-                    sitk.sitkLinear,
-                    Out_Origin,
-                    Out_Spacing,
-                    Out_Direction,
-                    0,
-                )
-
-                # Change contrast based on user input
-                Image2D = sitk.Cast(
-                    sitk.IntensityWindowing(
-                        Image2D,
-                        windowMinimum=INTACT_Props.Slice_min,
-                        windowMaximum=INTACT_Props.Slice_max,
-                        outputMinimum=0.0,
-                        outputMaximum=255.0,
-                    ),
-                    sitk.sitkUInt8,
-                )
-
-                # Write Image :
-                Array = sitk.GetArrayFromImage(Image2D)
-                Flipped_Array = np.flipud(Array.reshape(Array.shape[1], Array.shape[2]))
-
-                cv2.imwrite(ImagePath, Flipped_Array)
-
-                # Update Blender Image data :
-                BlenderImage = bpy.data.images.get(f"{Plane.name}.png")
-                if not BlenderImage:
-                    bpy.data.images.load(ImagePath)
-                    BlenderImage = bpy.data.images.get(f"{Plane.name}.png")
-                else:
-                    BlenderImage.filepath = ImagePath
-                    BlenderImage.reload()
-
-                # This is necessary, as if the cube boolean is added (while the cropping cube
-                # is outside of the 3D mesh) it leads to some of the slices being displayed solid white.
-                # This seems to be a bug within blender.
-                if INTACT_Props.Remove_slice_outside_object:
-                    Plane.data.update()
 
+# Largest slice side sampled while dragging, larger volumes are previewed from a 2x or
+# 4x downsampled pyramid level :
+PREVIEW_SIZE = 512
+PREVIEW_FACTORS = (2, 4)
 
-@persistent
-def AxialSliceUpdate(scene):
-    SlicesUpdate(scene, 0)
 
+def SliceSize(Size, slice_index):
+    """(width, height) of the slice of a volume of Size"""
+    return [(Size[0], Size[1]), (Size[0], Size[2]), (Size[1], Size[2])][slice_index]
 
-@persistent
-def CoronalSliceUpdate(scene):
-    SlicesUpdate(scene, 1)
+
+def PreviewFactor(Size):
+    """Pyramid level factor of the preview slices of a volume of Size, 1 when the
+    full resolution is small enough"""
+    Factor = 1
+    for Factor in (1,) + PREVIEW_FACTORS:
+        if max(Size) <= PREVIEW_SIZE * Factor:
+            break
+    return Factor
+
+
+def SliceArray(Request):
+    """uint8 windowed slice of a SliceRequest. No bpy data is touched, safe to run on
+    the slice worker thread."""
+    ImageData, slice_index = Request["ImageData"], Request["Index"]
+    Wmin, Wmax = Request["Window"]
+
+    # Get ImageData Info from its header, kept in the volume cache :
+    Sz, Sp, Ortho_Origin = volume_cache.image_info(ImageData)
+    Full_Size = SliceSize(Sz, slice_index)
+
+    # Preview slices are sampled from a coarser pyramid level, then scaled back up
+    # to the full slice size. Full slices read the memory mapped nrrd, the whole
+    # image is only read when the file cannot be mapped or for sitk resampling :
+    Factor = PreviewFactor(Sz) if Request["Preview"] else 1
+    if Factor > 1:
+        with SliceWorker.ResampleLock:
+            Image3D_255 = volume_cache.pyramid_level(ImageData, Factor)
+        Voxels = sitk.GetArrayViewFromImage(Image3D_255)
+        Sp, Sz, Ortho_Origin = (Image3D_255.GetSpacing(), Image3D_255.GetSize(),
+                                Image3D_255.GetOrigin())
+    else:
+        Voxels, Image3D_255 = volume_cache.volume_array(ImageData)
+
+    # Output Parameters, the slice pixels follow the voxels of its two image axes :
+    if slice_index == 0:
+        Out_Origin = [Ortho_Origin[0], Ortho_Origin[1], 0]
+        Out_Size = (Sz[0], Sz[1], 1)
+        Out_Spacing = (Sp[0], Sp[1], Sp[2])
+    elif slice_index == 1:
+        Out_Origin = [Ortho_Origin[0], Ortho_Origin[2], 0]
+        Out_Size = (Sz[0], Sz[2], 1)
+        Out_Spacing = (Sp[0], Sp[2], Sp[1])
+    elif slice_index == 2:
+        Out_Origin = [Ortho_Origin[1], Ortho_Origin[2], 0]
+        Out_Size = (Sz[1], Sz[2], 1)
+        Out_Spacing = (Sp[1], Sp[2], Sp[0])
+
+    Out_Direction = Vector(np.identity(3).flatten())
+
+    Rvec = Request["Rotation"]
+    Tvec = Request["Translation"]
+
+    # Euler3DTransform :
+    Euler3D = sitk.Euler3DTransform()
+    Euler3D.SetCenter((0, 0, 0))
+    Euler3D.SetRotation(Rvec[0], Rvec[1], Rvec[2])
+    Euler3D.SetTranslation(Tvec)
+    Euler3D.ComputeZYXOn()
+
+    # Axis aligned slices are read from the cached voxel array, only
+    # oblique ones go through the resampler :
+    Slice = AxisAlignedSlice(
+        Voxels,
+        Euler3D.GetMatrix(),
+        Euler3D.GetTranslation(),
+        Ortho_Origin,
+        Sp,
+        Out_Origin,
+        Out_Size,
+        Out_Spacing,
+    )
+    if Slice is not None:
+        Array = WindowSlice(Slice, Wmin, Wmax)
+    else:
+        if Image3D_255 is None:
+            Image3D_255 = volume_cache.reformat_image(ImageData)
+        Array = ResampleSlice(Image3D_255, Euler3D, Out_Origin, Out_Size, Out_Spacing,
+                              Out_Direction, Wmin, Wmax)
+
+    if Factor > 1:
+        Array = cv2.resize(Array, Full_Size, interpolation=cv2.INTER_LINEAR)
+    return Array
+
+
+def ResampleSlice(Image3D_255, Euler3D, Out_Origin, Out_Size, Out_Spacing, Out_Direction,
+                  Wmin, Wmax):
+    """uint8 windowed slice resampled by sitk, for the slices AxisAlignedSlice does not serve"""
+    # The cached image is shared by the main and the worker thread :
+    with SliceWorker.ResampleLock:
+        Image2D = sitk.Resample(
+            Image3D_255,
+            Out_Size,
+            Euler3D,
+            sitk.sitkLinear,
+            Out_Origin,
+            Out_Spacing,
+            Out_Direction,
+            0,
+        )
+
+    # Change contrast based on user input
+    Image2D = sitk.Cast(
+        sitk.IntensityWindowing(
+            Image2D,
+            windowMinimum=Wmin,
+            windowMaximum=Wmax,
+            outputMinimum=0.0,
+            outputMaximum=255.0,
+        ),
+        sitk.sitkUInt8,
+    )
+    Array = sitk.GetArrayFromImage(Image2D)
+    return Array.reshape(Array.shape[1], Array.shape[2])
+
+
+def ApplySlice(Request, Array):
+    """Show the Array of a SliceRequest in its slice image, main thread only. A result
+    older than the one already shown is dropped."""
+    Plane = bpy.data.objects.get(Request["Plane"])
+    if not Plane or Request["Sequence"] < SliceState.Shown.get(Plane.name, 0):
+        return
+    SliceState.Shown[Plane.name] = Request["Sequence"]
+
+    # Update Blender Image data in place, no file is written :
+    SliceState.Arrays[Plane.name] = Array
+    BlenderImage = SliceImage(Plane, *Array.shape)
+    BlenderImage.pixels.foreach_set(SlicePixels(Array))
+    BlenderImage.update()
+
+    # This is necessary, as if the cube boolean is added (while the cropping cube
+    # is outside of the 3D mesh) it leads to some of the slices being displayed solid white.
+    # This seems to be a bug within blender.
+    if bpy.context.scene.INTACT_Props.Remove_slice_outside_object:
+        Plane.data.update()
+
+
+# Seconds between two checks for slice worker results :
+SLICE_POLL_INTERVAL = 0.02
+# Seconds a previewed slice stays still before its full resolution pass :
+SLICE_IDLE_DELAY = 0.25
+
+
+class SliceWorker:
+    """Background thread resampling the slices. Only the latest request of every slice
+    is kept, so a dragged slice skips the poses there was no time for, and the
+    results are applied on the main thread by SliceResultsTimer. Previewed slices
+    are resampled again at full resolution once they stop moving."""
+    Lock = threading.Lock()
+    ResampleLock = threading.Lock()
+    # Latest request not started yet, and latest result not applied yet, of every slice :
+    Pending = {}
+    Results = {}
+    Thread = None
+    # Latest preview request, and its time, of the slices waiting for a full
+    # resolution pass. Main thread only :
+    Refine = {}
+
+    @classmethod
+    def submit(cls, Request):
+        with cls.Lock:
+            cls.Pending[Request["Plane"]] = Request
+            if cls.Thread is None:
+                cls.Thread = threading.Thread(target=cls.run, daemon=True)
+                cls.Thread.start()
+        if Request["Preview"]:
+            cls.Refine[Request["Plane"]] = (Request, Tcounter())
+        if not bpy.app.timers.is_registered(SliceResultsTimer):
+            bpy.app.timers.register(SliceResultsTimer, first_interval=SLICE_POLL_INTERVAL)
+
+    @classmethod
+    def run(cls):
+        while True:
+            with cls.Lock:
+                if not cls.Pending:
+                    cls.Thread = None
+                    return
+                Requests = list(cls.Pending.values())
+                cls.Pending.clear()
+            for Request in Requests:
+                try:
+                    Result = (Request, SliceArray(Request), None)
+                except Exception as Error:
+                    Result = (Request, None, Error)
+                with cls.Lock:
+                    cls.Results[Request["Plane"]] = Result
+
+
+def SliceResultsTimer():
+    with SliceWorker.Lock:
+        Results = list(SliceWorker.Results.values())
+        SliceWorker.Results.clear()
+
+    if hasattr(bpy.context.scene, "INTACT_Props"):
+        for Request, Array, Error in Results:
+            if Error:
+                print(f"Slice {Request['Plane']} update failed : {Error}")
+                continue
+            ApplySlice(Request, Array)
+
+    # Full resolution pass of the slices that stopped moving :
+    Now = Tcounter()
+    for Name, (Request, Time) in list(SliceWorker.Refine.items()):
+        if Now - Time > SLICE_IDLE_DELAY:
+            del SliceWorker.Refine[Name]
+            SliceState.Sequence += 1
+            SliceWorker.submit(dict(Request, Preview=False, Sequence=SliceState.Sequence))
+
+    with SliceWorker.Lock:
+        Busy = SliceWorker.Thread is not None or bool(SliceWorker.Results)
+    # Registered again by the next submit :
+    return SLICE_POLL_INTERVAL if Busy or SliceWorker.Refine else None
+
+
+def SlicesUpdate(scene, slice_index, Force=True, Async=False):
+    """ Update slices when moved in UI. Slice index determines which slice to update 0 = axial, 1 = Coronal,
+    2 = Sagital. Unless Force, a slice that did not move relative to its CT volume is not resampled again.
+    Async slices are resampled by the slice worker and shown once ready, first as a coarse preview then at full
+    resolution once they stop moving. The others are resampled at full resolution before returning.
+    """
+    Request = SliceRequest(slice_index, Force, Preview=Async)
+    if Request is None:
+        return
+    if Async:
+        SliceWorker.submit(Request)
+    else:
+        SliceWorker.Refine.pop(Request["Plane"], None)
+        ApplySlice(Request, SliceArray(Request))
 
 
 @persistent
-def SagitalSliceUpdate(scene):
-    SlicesUpdate(scene, 2)
+def SlicesDepsgraphUpdate(scene, depsgraph):
+    """Single depsgraph handler of the slices : only the slices whose own transform,
+    or the transform of their CT volume or slices pointer, was updated are checked"""
+    Moved = set()
+    for update in depsgraph.updates:
+        if not update.is_updated_transform or not isinstance(update.id, bpy.types.Object):
+            continue
+        Name = update.id.name
+        if Name.endswith(("_CTVolume", "_SLICES_POINTER")):
+            Moved.update(range(len(SLICE_SUFFIXES)))
+        else:
+            Moved.update(i for i, Suffix in enumerate(SLICE_SUFFIXES) if Name.endswith(Suffix))
+
+    for slice_index in sorted(Moved):
+        SlicesUpdate(scene, slice_index, Force=False, Async=True)
 
 
-def SlicesUpdateAll(scene):
-    SlicesUpdate(scene, 0)
-    SlicesUpdate(scene, 1)
-    SlicesUpdate(scene, 2)
+def SlicesUpdateAll(scene, Async=False):
+    SlicesUpdate(scene, 0, Async=Async)
+    SlicesUpdate(scene, 1, Async=Async)
+    SlicesUpdate(scene, 2, Async=Async)
+
+
+@persistent
+def SlicesLoadPost(*args):
+    """The slice images live in memory only, fill them again in an opened project"""
+    SliceState.Matrices.clear()
+    SliceState.Arrays.clear()
+    SliceState.Shown.clear()
+    scene = bpy.context.scene
+    if hasattr(scene, "INTACT_Props"):
+        SlicesUpdateAll(scene)
 
 
 def Add_Cam_To_Plane(Plane, CamDistance, ClipOffset):
@@ -863,19 +1651,14 @@ def AddSlice(slice_index, Prefix, ImageInfo):
     for node in nodes:
         if node.type != "OUTPUT_MATERIAL":
             nodes.remove(node)
-    SlicesDir = AbsPath(ImageInfo.SlicesDir)
-    ImageName = f"{name}.png"
-    ImagePath = join(SlicesDir, ImageName)
-
-    # write "name.png" to here ImagePath
+    # fill the "name.png" image in memory
     SlicesUpdate(bpy.context.scene, slice_index)
 
-    BlenderImage = bpy.data.images.get(ImageName) or bpy.data.images.load(ImagePath)
+    BlenderImage = bpy.data.images.get(f"{name}.png")
 
     TextureCoord = AddNode(nodes, type="ShaderNodeTexCoord", name="TextureCoord")
     ImageTexture = AddNode(nodes, type="ShaderNodeTexImage", name="Image Texture")
     ImageTexture.image = BlenderImage
-    BlenderImage.colorspace_settings.name = "Non-Color"
     materialOutput = nodes["Material Output"]
     links.new(TextureCoord.outputs[0], ImageTexture.inputs[0])
     links.new(ImageTexture.outputs[0], materialOutput.inputs[0])
@@ -914,6 +1697,58 @@ def ResizeImage(sitkImage, Ratio):
     return ResizedImage
 
 
+def BudgetFactors(Size, Spacing, BudgetBytes, BytesPerVoxel=4):
+    """Integer (x, y, z) reduction factors fitting a Size volume in BudgetBytes.
+
+    The axis with the finest reduced spacing is reduced first, so the render
+    voxels stay as isotropic as possible.
+    """
+    Factors = [1, 1, 1]
+
+    def Bytes():
+        return np.prod([-(-Size[i] // Factors[i]) for i in range(3)]) * BytesPerVoxel
+
+    while Bytes() > BudgetBytes:
+        Axes = [i for i in range(3) if Factors[i] < Size[i]]
+        if not Axes:
+            break
+        Axis = min(Axes, key=lambda i: (Spacing[i] * Factors[i], -Size[i] / Factors[i]))
+        Factors[Axis] += 1
+
+    return tuple(Factors)
+
+
+def BlockMeanReduce(Array, Factors, ChunkSlices=64):
+    """Box filter downsampling of a (z, y, x) uint8 array by (x, y, z) Factors.
+
+    Every output voxel is the mean of its block, the last block of an axis may
+    be smaller. Slices are processed in chunks, only the sums of one chunk are
+    held in memory.
+    """
+    fx, fy, fz = Factors
+    Z, Y, X = Array.shape
+
+    def Blocks(n, f):
+        Starts = np.arange(0, n, f)
+        return Starts, np.diff(np.append(Starts, n))
+
+    StartsY, CountY = Blocks(Y, fy)
+    StartsX, CountX = Blocks(X, fx)
+    Out = np.empty((-(-Z // fz), len(StartsY), len(StartsX)), dtype=np.uint8)
+
+    Step = fz * max(1, ChunkSlices // fz)
+    for start in range(0, Z, Step):
+        Chunk = Array[start:start + Step]
+        StartsZ, CountZ = Blocks(Chunk.shape[0], fz)
+        Sum = np.add.reduceat(Chunk, StartsX, axis=2, dtype=np.uint32)
+        Sum = np.add.reduceat(Sum, StartsY, axis=1)
+        Sum = np.add.reduceat(Sum, StartsZ, axis=0)
+        Count = CountZ[:, None, None] * CountY[None, :, None] * CountX[None, None, :]
+        Out[start // fz:start // fz + len(StartsZ)] = (Sum + Count // 2) // Count
+
+    return Out
+
+
 # def VTK_Terminal_progress(caller, event, q):
 #     ProgRatio = round(float(caller.GetProgress()), 2)
 #     q.put(
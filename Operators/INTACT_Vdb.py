@@ -0,0 +1,61 @@
+# Python imports :
+import numpy as np
+from os.path import join
+
+# Blender ships the OpenVDB python module as openvdb (4.1+) or pyopenvdb (older),
+# some builds ship neither :
+try:
+    import openvdb as vdb
+except ImportError:
+    try:
+        import pyopenvdb as vdb
+    except ImportError:
+        vdb = None
+
+#######################################################################################
+# OpenVDB volume :
+# The 0-255 render volume is written as a sparse fog volume density grid, read by a
+# Blender Volume object. Only the voxels above the empty space floor are active, so
+# the grid grows with the object, not with its bounding box.
+#######################################################################################
+
+GRID_NAME = "density"
+
+
+def available():
+    return vdb is not None
+
+
+def vdb_path(UserProjectDir, Prefix):
+    return join(UserProjectDir, f"{Prefix}_Volume.vdb")
+
+
+def write_vdb(Array, Spacing, Floor, VdbPath, ChunkSlices=64):
+    """Write a (z, y, x) uint8 volume to VdbPath as a 0-1 density grid, the voxels at
+    or below Floor are left inactive. No bpy data is touched, safe on a worker
+    thread. Returns the active voxel count."""
+    Grid = vdb.FloatGrid(0.0)
+    Grid.name = GRID_NAME
+    Grid.gridClass = vdb.GridClass.FOG_VOLUME
+
+    # Centered on the origin like the plane stacks, voxel i at (i + 0.5 - Size / 2) * Spacing :
+    Depth, Height, Width = Array.shape
+    Size = (Width, Height, Depth)
+    Translation = [(0.5 - Size[i] / 2) * Spacing[i] for i in range(3)]
+    Grid.transform = vdb.createLinearTransform([
+        [Spacing[0], 0.0, 0.0, 0.0],
+        [0.0, Spacing[1], 0.0, 0.0],
+        [0.0, 0.0, Spacing[2], 0.0],
+        Translation + [1.0],
+    ])
+
+    for z0 in range(0, Depth, ChunkSlices):
+        Chunk = Array[z0:z0 + ChunkSlices]
+        Density = np.where(Chunk > Floor, Chunk / 255.0, 0.0).astype(np.float32)
+        # Grid index order is (x, y, z), voxels equal to the background stay inactive :
+        Grid.copyFromArray(np.ascontiguousarray(Density.transpose(2, 1, 0)),
+                           ijk=(0, 0, z0), tolerance=0.0)
+    Grid.pruneInactive()
+
+    vdb.write(VdbPath, grids=[Grid])
+    return Grid.activeVoxelCount()
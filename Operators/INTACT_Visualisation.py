@@ -22,13 +22,19 @@ class CroppingCubeCreation(bpy.types.Operator):
         surf_3d = INTACT_Props.Surf_3D
         cropping_cube = INTACT_Props.Cropping_Cube
 
-        # Add boolean to ct volume + surface scan (if it exists)
-        to_add_boolean = [ct_vol]
+        # Add boolean to ct volume, its bricks and LOD stacks + surface scan (if it exists)
+        to_add_boolean = [ct_vol] + utils.VolumeBricks(ct_vol) + utils.VolumeLods(ct_vol)
         if surf_3d:
             to_add_boolean.append(surf_3d)
 
         for obj in to_add_boolean:
-            create_boolean(obj, "Cropping Cube", "DIFFERENCE", cropping_cube)
+            if obj.type == "MESH":
+                create_boolean(obj, "Cropping Cube", "DIFFERENCE", cropping_cube)
+            elif obj.type == "VOLUME":
+                # OpenVDB volumes take no boolean, their material is cropped instead :
+                for mat in obj.data.materials:
+                    if mat and mat.node_tree and "DensityRange" in mat.node_tree.nodes:
+                        utils.VdbCrop(mat, cropping_cube)
 
         print("\nBoolean modifiers applied")
 
@@ -515,6 +521,27 @@ class INTACT_OT_AddSlices(bpy.types.Operator):
             return {"FINISHED"}
 
 
+class INTACT_OT_ExportSlices(bpy.types.Operator):
+    """ Write the current slices to PNG files in the project Slices folder """
+
+    bl_idname = "intact.export_slices"
+    bl_label = "EXPORT SLICES"
+
+    def execute(self, context):
+        INTACT_Props = bpy.context.scene.INTACT_Props
+
+        if not INTACT_Props.Axial_Slice:
+            message = [" Please click 'Slice Volume' first "]
+            utils.ShowMessageBox(message=message, icon="COLORSET_02_VEC")
+            return {"CANCELLED"}
+
+        if not utils.SliceState.Arrays:
+            utils.SlicesUpdateAll(bpy.context.scene)
+        Paths = utils.ExportSlices(bpy.context.scene)
+        self.report({"INFO"}, f"{len(Paths)} slices exported")
+        return {"FINISHED"}
+
+
 class INTACT_OT_MultiView(bpy.types.Operator):
     """ MultiView Toggle """
 
@@ -630,6 +657,7 @@ class INTACT_OT_MultiView(bpy.types.Operator):
 
 
 classes = [INTACT_OT_AddSlices,
+           INTACT_OT_ExportSlices,
            INTACT_OT_MultiView,
            CroppingCubeCreation]
 
@@ -0,0 +1,177 @@
+# Python imports :
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+
+import SimpleITK as sitk
+
+#######################################################################################
+# Volume cache :
+# Process wide cache of the volumes read from disk by the slice updates. Entries are
+# keyed by path, mtime and size, so a rewritten file is read again, and evicted least
+# recently used first once their total size exceeds the memory cap. The entries of
+# the file being read are never evicted, a volume larger than the cap stays cached
+# until another one is read. Memory mapped arrays cost no memory of their own, the
+# OS pages them in and out. Downsampled pyramid levels, used by the slice previews,
+# are cached the same way.
+#######################################################################################
+
+
+def system_memory():
+    """Physical memory in bytes, None where the OS does not tell"""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# Memory cap of the cached volumes : a quarter of the memory, at least 2 GB :
+CACHE_BYTES = max(2 * 1024 ** 3, (system_memory() or 0) // 4)
+
+NRRD_TYPES = {
+    "uchar": np.uint8, "unsigned char": np.uint8, "uint8": np.uint8, "uint8_t": np.uint8,
+    "signed char": np.int8, "int8": np.int8, "int8_t": np.int8,
+    "short": np.int16, "int16": np.int16, "int16_t": np.int16, "signed short": np.int16,
+    "ushort": np.uint16, "unsigned short": np.uint16, "uint16": np.uint16, "uint16_t": np.uint16,
+    "int": np.int32, "int32": np.int32, "int32_t": np.int32, "signed int": np.int32,
+    "uint": np.uint32, "unsigned int": np.uint32, "uint32": np.uint32, "uint32_t": np.uint32,
+    "float": np.float32, "double": np.float64,
+}
+
+
+class VolumeCache:
+    """LRU cache of volumes, get() reads them through a loader on a miss"""
+
+    def __init__(self, MaxBytes=CACHE_BYTES):
+        self.MaxBytes = MaxBytes
+        self.Entries = OrderedDict()
+        self.Bytes = 0
+        self.Lock = threading.Lock()
+
+    def get(self, Kind, Path, Loader):
+        """Cached Loader(Path) result. Loader returns (value, bytes held in memory).
+        Kind tells apart the different values made from the same file."""
+        Stat = os.stat(Path)
+        Key = (Kind, os.path.abspath(Path), Stat.st_mtime_ns, Stat.st_size)
+        with self.Lock:
+            if Key in self.Entries:
+                self.Entries.move_to_end(Key)
+                return self.Entries[Key][0]
+
+        Value, Bytes = Loader(Path)
+
+        with self.Lock:
+            # Older versions of the file are stale :
+            for Old in [k for k in self.Entries if k[:2] == Key[:2]]:
+                self.Bytes -= self.Entries.pop(Old)[1]
+            self.Entries[Key] = (Value, Bytes)
+            self.Bytes += Bytes
+            if Bytes:
+                self.evict(Keep=Key[1])
+        return Value
+
+    def evict(self, Keep):
+        """Drop least recently used entries until the cap is met, except the
+        entries of the file Keep. Called with the lock held"""
+        for Old in [k for k in self.Entries if k[1] != Keep]:
+            if self.Bytes <= self.MaxBytes:
+                break
+            self.Bytes -= self.Entries.pop(Old)[1]
+
+    def clear(self):
+        with self.Lock:
+            self.Entries.clear()
+            self.Bytes = 0
+
+
+Cache = VolumeCache()
+
+
+def read_image_info(Path):
+    """(Size, Spacing, Origin) of read_reformat_image(Path), from the file header only"""
+    reader = sitk.ImageFileReader()
+    reader.SetFileName(Path)
+    reader.ReadImageInformation()
+    Sp, Sz = np.array(reader.GetSpacing()), np.array(reader.GetSize())
+    return (tuple(reader.GetSize()), tuple(reader.GetSpacing()),
+            tuple(-0.5 * Sp * (Sz - 1))), 0
+
+
+def image_info(Path):
+    """Cached read_image_info"""
+    return Cache.get("info", Path, read_image_info)
+
+
+def read_reformat_image(Path):
+    """sitk image of Path centered on the origin with an identity direction, the
+    frame the slices are resampled in"""
+    Image3D = sitk.ReadImage(Path)
+    Sp, Sz = np.array(Image3D.GetSpacing()), np.array(Image3D.GetSize())
+    Image3D.SetOrigin(-0.5 * Sp * (Sz - 1))
+    Image3D.SetDirection(np.identity(3).flatten())
+    return Image3D, sitk.GetArrayViewFromImage(Image3D).nbytes
+
+
+def reformat_image(Path):
+    """Cached read_reformat_image, the image must not be modified"""
+    return Cache.get("reformat", Path, read_reformat_image)
+
+
+def read_pyramid_level(Path, Factor):
+    """reformat_image of Path shrunk by Factor, each voxel the mean of a Factor³ block,
+    centered on the origin like it"""
+    Image3D = sitk.BinShrink(reformat_image(Path), [Factor] * 3)
+    Sp, Sz = np.array(Image3D.GetSpacing()), np.array(Image3D.GetSize())
+    Image3D.SetOrigin(-0.5 * Sp * (Sz - 1))
+    return Image3D, sitk.GetArrayViewFromImage(Image3D).nbytes
+
+
+def pyramid_level(Path, Factor):
+    """Cached read_pyramid_level, the image must not be modified"""
+    return Cache.get(f"pyramid{Factor}", Path, lambda P: read_pyramid_level(P, Factor))
+
+
+def nrrd_memmap(Path):
+    """Read only (z, y, x) memory map of a raw encoded nrrd volume, None if the
+    file is compressed or detached"""
+    Header = {}
+    with open(Path, "rb") as rf:
+        if not rf.readline().startswith(b"NRRD"):
+            return None
+        for Line in iter(rf.readline, b""):
+            Line = Line.decode("latin-1").strip()
+            if not Line:
+                break
+            if Line.startswith("#") or ":=" in Line:
+                continue
+            Field, _, Value = Line.partition(":")
+            Header[Field.strip()] = Value.strip()
+        Offset = rf.tell()
+
+    if Header.get("encoding") != "raw" or "data file" in Header or "datafile" in Header:
+        return None
+    if Header.get("type") not in NRRD_TYPES or Header.get("dimension") != "3":
+        return None
+    dtype = np.dtype(NRRD_TYPES[Header["type"]])
+    if dtype.itemsize > 1:
+        dtype = dtype.newbyteorder("<" if Header.get("endian", "little") == "little" else ">")
+    Sizes = [int(v) for v in Header["sizes"].split()]
+    return np.memmap(Path, dtype=dtype, mode="r", offset=Offset, shape=tuple(reversed(Sizes)))
+
+
+def read_volume_array(Path):
+    """Memory map of a volume (see nrrd_memmap), None when the file does not allow it"""
+    return nrrd_memmap(Path), 0
+
+
+def volume_array(Path):
+    """(z, y, x) read only array of a volume and the image it is a view of : the
+    cached memory map and None when the file allows it, else an array view of
+    the cached reformat_image and that image. The view is only valid while the
+    image is referenced, so it is not cached on its own."""
+    Array = Cache.get("array", Path, read_volume_array)
+    if Array is not None:
+        return Array, None
+    Image3D = reformat_image(Path)
+    return sitk.GetArrayViewFromImage(Image3D), Image3D
@@ -0,0 +1,304 @@
+import bpy
+import json
+import numpy as np
+from time import perf_counter as Tcounter
+from mathutils import Vector
+from bpy.app.handlers import persistent
+
+from . import INTACT_Utils as utils
+
+#######################################################################################
+# Volume view switching :
+# While a 3D viewport is navigated the CT volumes are swapped for their coarser LOD
+# stacks, full detail is restored once the views stop moving. Renders always use the
+# full stack, the LOD objects are never rendered, and the blend file is always saved
+# with the full stacks shown.
+# Volumes with view aligned stacks show the X, Y or Z stack most aligned with the
+# largest 3D viewport, and with the scene camera when rendered by the INTACT render
+# operators.
+# Bricked volumes hide the bricks outside of every view frustum and the bricks inside
+# the cropping cube, in the viewport and, against the camera, in renders.
+# Every change is made on the main thread, from the view timer or the render
+# operators, and none while a render runs.
+#######################################################################################
+
+# Seconds between two checks of the views :
+POLL_INTERVAL = 0.1
+# Seconds without view change before full detail is restored :
+IDLE_DELAY = 0.3
+# Largest number of planes drawn while navigating :
+NAVIGATION_PLANES = 256
+# A stack is replaced only by one this much better aligned, so the volume does not
+# flicker around 45 degrees :
+SWITCH_RATIO = 1.15
+
+
+class ViewState:
+    Matrices = None
+    LastMove = 0.0
+    # Volumes swapped for a LOD : [(volume, lod)]
+    Swapped = []
+    # Bricks of the bricked volumes : {prefix: (bricks json, boxes, objects)}
+    Bricks = {}
+    # Set by the render handlers, the scene is left alone while it renders :
+    Rendering = False
+
+
+def view_regions():
+    """region_3d of every 3D viewport, the largest first"""
+    Regions = []
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type != "VIEW_3D":
+                continue
+            for space in area.spaces:
+                if space.type == "VIEW_3D" and space.region_3d:
+                    Regions.append((area.width * area.height, space.region_3d))
+    Regions.sort(key=lambda r: -r[0])
+    return [r3d for _, r3d in Regions]
+
+
+def view_direction(ViewWorld, Perspective, Center):
+    """World direction the viewer with ViewWorld matrix looks at Center along"""
+    if Perspective:
+        return Center - ViewWorld.translation
+    return ViewWorld.to_3x3() @ Vector((0.0, 0.0, -1.0))
+
+
+def aligned_axis(Volume, Direction, Current):
+    """Stack axis of Volume most aligned with the world Direction"""
+    Local = Volume.matrix_world.to_3x3().inverted_safe() @ Direction
+    Weights = {Axis: abs(Local[i]) for i, Axis in enumerate("XYZ")}
+    Best = max(Weights, key=Weights.get)
+    if Current and Weights[Best] < Weights[Current] * SWITCH_RATIO:
+        return Current
+    return Best
+
+
+def align_stacks(ViewWorld, Perspective):
+    """Show the stack of every view aligned volume most aligned with the viewer"""
+    INTACT_Props = bpy.context.scene.INTACT_Props
+    for ImageInfo in INTACT_Props.Images:
+        Volume = bpy.data.objects.get(f"{ImageInfo.Prefix}_CTVolume")
+        if not Volume or not ImageInfo.ViewStacks:
+            continue
+        Meshes = utils.StackMeshes(ImageInfo.Prefix)
+        Current = next((Axis for Axis, mesh in Meshes.items() if mesh == Volume.data), None)
+        Center = Volume.matrix_world.translation
+        Axis = aligned_axis(Volume, view_direction(ViewWorld, Perspective, Center), Current)
+        if Axis != Current and Axis in Meshes:
+            Volume.data = Meshes[Axis]
+
+
+def brick_boxes(ImageInfo):
+    """(B, 2, 3) min and max corners of the bricks of a volume, in its frame"""
+    Boxes = np.array(json.loads(ImageInfo.Bricks), dtype=np.float64).reshape(-1, 2, 3)
+    Size, Spacing = np.array(ImageInfo.RenderSz), np.array(ImageInfo.RenderSp)
+    return (Boxes - Size / 2) * Spacing
+
+
+def volume_bricks(ImageInfo, Volume):
+    """(Boxes, Objects) of a bricked volume, objects in brick order"""
+    Cached = ViewState.Bricks.get(ImageInfo.Prefix)
+    if not Cached or Cached[0] != ImageInfo.Bricks:
+        Objects = sorted(utils.VolumeBricks(Volume), key=lambda obj: obj.name)
+        Cached = (ImageInfo.Bricks, brick_boxes(ImageInfo), Objects)
+        ViewState.Bricks[ImageInfo.Prefix] = Cached
+    return Cached[1], Cached[2]
+
+
+def box_corners(Boxes, Matrix):
+    """(B, 8, 4) homogeneous world corners of the (B, 2, 3) Boxes"""
+    Corners = np.ones((len(Boxes), 8, 4))
+    for k in range(8):
+        for axis in range(3):
+            Corners[:, k, axis] = Boxes[:, (k >> axis) & 1, axis]
+    return Corners @ np.array(Matrix).T
+
+
+def outside_frustum(Corners, Projection):
+    """Boxes whose corners are all outside the same clip plane of Projection"""
+    Clip = Corners @ np.array(Projection).T
+    W = Clip[..., 3:]
+    Outside = np.concatenate([Clip[..., :3] < -W, Clip[..., :3] > W], axis=2)
+    return Outside.all(axis=1).any(axis=1)
+
+
+def inside_object_bounds(Corners, Object):
+    """Boxes whose corners are all inside the bounding box of Object"""
+    Local = Corners @ np.array(Object.matrix_world.inverted()).T
+    Bounds = np.array(Object.bound_box)
+    Inside = (Local[..., :3] >= Bounds.min(axis=0)) & (Local[..., :3] <= Bounds.max(axis=0))
+    return Inside.all(axis=(1, 2))
+
+
+def cull_bricks(Projections, Render=False):
+    """Hide the bricks outside of every Projections frustum or inside the cropping
+    cube : hide_render when Render, hide_viewport otherwise. Without Projections
+    only the cropping cube hides bricks"""
+    Attribute = "hide_render" if Render else "hide_viewport"
+    INTACT_Props = bpy.context.scene.INTACT_Props
+    for ImageInfo in INTACT_Props.Images:
+        Volume = bpy.data.objects.get(f"{ImageInfo.Prefix}_CTVolume")
+        if not Volume or not ImageInfo.Bricks:
+            continue
+        Boxes, Objects = volume_bricks(ImageInfo, Volume)
+        if len(Objects) != len(Boxes):
+            continue
+
+        Corners = box_corners(Boxes, Volume.matrix_world)
+        Visible = np.full(len(Boxes), Projections is None)
+        for Projection in Projections or []:
+            Visible |= ~outside_frustum(Corners, Projection)
+        Crop = Volume.modifiers.get("Cropping Cube")
+        if Crop and Crop.object and (Crop.show_render if Render else Crop.show_viewport):
+            Visible &= ~inside_object_bounds(Corners, Crop.object)
+        # Bricks follow the volume visibility, and its LOD swap :
+        if Render:
+            Visible &= not Volume.hide_render
+        else:
+            Visible &= not (Volume.hide_viewport or Volume.hide_get())
+
+        try:
+            for Brick, Show in zip(Objects, Visible):
+                if getattr(Brick, Attribute) == Show:
+                    setattr(Brick, Attribute, not Show)
+        except ReferenceError:
+            # Bricks removed, found again on the next call
+            ViewState.Bricks.pop(ImageInfo.Prefix, None)
+
+
+def navigation_lod(Volume, ImageInfo):
+    """Finest LOD object of Volume drawing at most NAVIGATION_PLANES planes"""
+    Level = 0
+    while Level < ImageInfo.LodLevels and -(-ImageInfo.RenderSz[2] // 2 ** Level) > NAVIGATION_PLANES:
+        Level += 1
+    return bpy.data.objects.get(f"{ImageInfo.Prefix}_CTVolume_LOD{Level}") if Level else None
+
+
+def show_lods():
+    INTACT_Props = bpy.context.scene.INTACT_Props
+    for ImageInfo in INTACT_Props.Images:
+        Volume = bpy.data.objects.get(f"{ImageInfo.Prefix}_CTVolume")
+        if not Volume or Volume.hide_viewport or not ImageInfo.LodLevels:
+            continue
+        Lod = navigation_lod(Volume, ImageInfo)
+        if Lod:
+            Lod.hide_viewport = False
+            Volume.hide_viewport = True
+            ViewState.Swapped.append((Volume, Lod))
+
+
+def restore_volumes():
+    for Volume, Lod in ViewState.Swapped:
+        try:
+            Volume.hide_viewport = False
+            Lod.hide_viewport = True
+        except ReferenceError:
+            # Removed while navigating
+            pass
+    ViewState.Swapped = []
+
+
+def bricked_volumes(scene):
+    return any(ImageInfo.Bricks for ImageInfo in scene.INTACT_Props.Images)
+
+
+def camera_projection(scene, depsgraph):
+    """Projection and view matrix of the scene camera"""
+    Camera = scene.camera
+    Render = scene.render
+    return Camera.calc_matrix_camera(
+        depsgraph,
+        x=Render.resolution_x,
+        y=Render.resolution_y,
+        scale_x=Render.pixel_aspect_x,
+        scale_y=Render.pixel_aspect_y,
+    ) @ Camera.matrix_world.inverted()
+
+
+def view_timer():
+    scene = bpy.context.scene
+    if not hasattr(scene, "INTACT_Props") or ViewState.Rendering:
+        return POLL_INTERVAL
+
+    Regions = view_regions()
+    Matrices = [r3d.view_matrix.copy() for r3d in Regions]
+    Now = Tcounter()
+    if Matrices != ViewState.Matrices and Regions:
+        align_stacks(Regions[0].view_matrix.inverted(), Regions[0].is_perspective)
+    if ViewState.Matrices is not None and Matrices != ViewState.Matrices:
+        ViewState.LastMove = Now
+        if not ViewState.Swapped:
+            show_lods()
+    elif ViewState.Swapped and Now - ViewState.LastMove > IDLE_DELAY:
+        restore_volumes()
+    ViewState.Matrices = Matrices
+    cull_bricks([r3d.perspective_matrix for r3d in Regions])
+
+    # The render bricks follow the scene camera, ready for F12 :
+    if scene.camera and bricked_volumes(scene):
+        cull_bricks([camera_projection(scene, bpy.context.evaluated_depsgraph_get())], Render=True)
+
+    return POLL_INTERVAL
+
+
+def prepare_render(scene, depsgraph, Animation=False):
+    """Align the stacks and cull the render bricks for the scene camera, called by
+    the render operators before the render starts. The camera of an Animation
+    moves, its bricks are only culled by the cropping cube"""
+    if not hasattr(scene, "INTACT_Props") or not scene.camera:
+        return
+    Camera = scene.camera
+    align_stacks(Camera.matrix_world.normalized(), Camera.data.type != "ORTHO")
+    if bricked_volumes(scene):
+        cull_bricks(None if Animation else [camera_projection(scene, depsgraph)], Render=True)
+
+
+@persistent
+def render_started(scene, *args):
+    ViewState.Rendering = True
+
+
+@persistent
+def render_ended(scene, *args):
+    ViewState.Rendering = False
+
+
+@persistent
+def restore_before_save(*args):
+    # hide_viewport is saved : a file saved while navigating would open on the LODs
+    restore_volumes()
+
+
+#################################################################################################
+# Registration :
+#################################################################################################
+
+
+HANDLERS = [
+    ("render_init", render_started),
+    ("render_complete", render_ended),
+    ("render_cancel", render_ended),
+    ("save_pre", restore_before_save),
+]
+
+
+def register():
+    if not bpy.app.timers.is_registered(view_timer):
+        bpy.app.timers.register(view_timer, first_interval=POLL_INTERVAL, persistent=True)
+    for Name, Handler in HANDLERS:
+        Handlers = getattr(bpy.app.handlers, Name)
+        if Handler not in Handlers:
+            Handlers.append(Handler)
+
+
+def unregister():
+    if bpy.app.timers.is_registered(view_timer):
+        bpy.app.timers.unregister(view_timer)
+    for Name, Handler in HANDLERS:
+        Handlers = getattr(bpy.app.handlers, Name)
+        if Handler in Handlers:
+            Handlers.remove(Handler)
+    ViewState.Rendering = False
+    restore_volumes()
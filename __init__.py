@@ -92,7 +92,7 @@ else:
 
     # Addon modules imports :
     from . import INTACT_Props, INTACT_Panel
-    from .Operators import INTACT_ScanLoad, INTACT_Registration, INTACT_Visualisation, INTACT_ImagesOutput
+    from .Operators import INTACT_ScanLoad, INTACT_Registration, INTACT_Visualisation, INTACT_ImagesOutput, INTACT_VolumeView
 
     addon_modules = [
         INTACT_Props,
@@ -100,7 +100,8 @@ else:
         INTACT_ScanLoad,
         INTACT_Registration,
         INTACT_Visualisation,
-        INTACT_ImagesOutput
+        INTACT_ImagesOutput,
+        INTACT_VolumeView
     ]
     init_classes = []
 